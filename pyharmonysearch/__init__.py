@@ -21,5 +21,13 @@
     THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
-from .harmony_search import harmony_search, HarmonySearch
+from .harmony_search import harmony_search, harmony_search_racing, harmony_search_batched, HarmonySearch, EvaluationTimeout, \
+    RunTimeout, ElitePool
+from .cancellation import CancellationToken
 from .objective_function_interface import ObjectiveFunctionInterface
+from .history import HarmonyHistoryStore
+from .archive import HarmonyArchive
+from .sweep import harmony_search_sweep, grid, random_settings
+from .cooperative import harmony_search_cooperative
+from .discrete import DiscreteHarmonySearch
+from .compact import CompactMemory, CompactHistory, to_lists
@@ -0,0 +1,160 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import json
+import sqlite3
+
+
+class HarmonyArchive(object):
+
+    """
+        A persistent archive of evaluated harmonies backed by a local SQLite database. It serves two purposes:
+
+        1. Warm starts. A new search can seed its harmony memory from the best (top()) or from a diverse set of good (diverse())
+           harmonies found by earlier searches instead of starting cold.
+        2. Evaluation caching. Before calling get_fitness(), HarmonySearch can look the harmony up in the archive and reuse its
+           fitness. Because the archive lives on disk, the cache is shared by all runs, all pool workers, and later searches.
+
+        Harmonies are keyed by their JSON encoding, so every value a harmony can take must be JSON serializable. To keep the number
+        of transactions down, new records are buffered and written buffer_size at a time; call flush() (HarmonySearch does this at
+        the end of every run) to write them out. Pickling an archive only pickles its path, so one can be handed to pool workers,
+        each of which then opens its own connection.
+
+        The database uses SQLite's write-ahead log so that several processes can read while one writes. If the objective function
+        changes between searches, either turn caching off or re-score the seeded harmonies (see HarmonySearch).
+    """
+
+    def __init__(self, path, buffer_size=100, timeout=60.0):
+        self._path = path
+        self._buffer_size = buffer_size
+        self._timeout = timeout
+        self._connection = None
+        self._pending = dict()
+
+    def __getstate__(self):
+        self.flush()
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pending'] = dict()
+        return state
+
+    @property
+    def path(self):
+        return self._path
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self._path, timeout=self._timeout)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS harmonies (harmony TEXT PRIMARY KEY, fitness REAL NOT NULL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS harmonies_by_fitness ON harmonies (fitness)')
+            self._connection.commit()
+        return self._connection
+
+    @staticmethod
+    def _key(harmony):
+        return json.dumps(list(harmony))
+
+    def record(self, harmony, fitness):
+        """
+            Record the fitness of a harmony, replacing any earlier record of the same harmony.
+        """
+        self._pending[self._key(harmony)] = fitness
+        if len(self._pending) >= self._buffer_size:
+            self.flush()
+
+    def lookup(self, harmony):
+        """
+            Return the recorded fitness of the harmony, or None if it hasn't been evaluated before.
+        """
+        key = self._key(harmony)
+        if key in self._pending:
+            return self._pending[key]
+        row = self._connect().execute('SELECT fitness FROM harmonies WHERE harmony = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def flush(self):
+        """
+            Write all buffered records to the database.
+        """
+        if self._pending:
+            connection = self._connect()
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO harmonies (harmony, fitness) VALUES (?, ?)', self._pending.items())
+            self._pending.clear()
+
+    def close(self):
+        self.flush()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __len__(self):
+        self.flush()
+        return self._connect().execute('SELECT COUNT(*) FROM harmonies').fetchone()[0]
+
+    def top(self, k, maximize):
+        """
+            Return the k best (harmony, fitness) tuples in the archive, best first.
+        """
+        self.flush()
+        order = 'DESC' if maximize else 'ASC'
+        rows = self._connect().execute('SELECT harmony, fitness FROM harmonies ORDER BY fitness {} LIMIT ?'.format(order), (k,))
+        return [(json.loads(harmony), fitness) for harmony, fitness in rows]
+
+    def diverse(self, k, maximize, pool_size=None):
+        """
+            Return k good but mutually dissimilar (harmony, fitness) tuples. The best pool_size (by default 10 * k) harmonies are
+            considered, and starting from the best one, the candidate that's farthest from all harmonies chosen so far is added until k
+            have been chosen. Numeric values are compared by their difference relative to the spread of that parameter in the pool;
+            other values count as either equal or completely different.
+        """
+        candidates = self.top(pool_size or 10 * k, maximize)
+        if len(candidates) <= k:
+            return candidates
+        num_parameters = min(len(harmony) for harmony, _ in candidates)
+        spreads = list()
+        for j in range(num_parameters):
+            values = [harmony[j] for harmony, _ in candidates]
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                spreads.append((max(values) - min(values)) or 1.0)
+            else:
+                spreads.append(None)
+
+        def distance(a, b):
+            total = 0.0
+            for j in range(num_parameters):
+                if spreads[j] is None:
+                    total += 0.0 if a[j] == b[j] else 1.0
+                else:
+                    total += ((a[j] - b[j]) / spreads[j]) ** 2
+            return total
+
+        chosen = [candidates.pop(0)]
+        nearest = [distance(harmony, chosen[0][0]) for harmony, _ in candidates]
+        while len(chosen) < k:
+            farthest = max(range(len(candidates)), key=nearest.__getitem__)
+            chosen.append(candidates.pop(farthest))
+            nearest.pop(farthest)
+            nearest = [min(d, distance(harmony, chosen[-1][0])) for d, (harmony, _) in zip(nearest, candidates)]
+        return chosen
@@ -0,0 +1,128 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from contextlib import contextmanager
+import multiprocessing
+import signal
+import threading
+import time
+
+# the Event shared with the parent process, set in pool workers by _initialize_worker()
+_worker_event = None
+
+
+class CancellationToken(object):
+
+    """
+        Lets a search be stopped early without losing the work done so far. Pass a token to any of the drivers (or to HarmonySearch) as
+        cancellation; runs check it before every improvisation, and once it's cancelled, each run stops and returns its current harmony
+        memory, so the driver still returns valid HarmonySearchResults. Runs that haven't started yet are skipped.
+
+        A token is cancelled by calling cancel() (e.g., from another thread), once timeout seconds have passed since it was created, or
+        when one of the given signals is received while a driver is running. For example, CancellationToken(signals=[signal.SIGINT])
+        turns Ctrl-C into "stop and give me what you have" instead of a KeyboardInterrupt, and a second Ctrl-C still interrupts.
+
+        Parallel drivers share the token with their worker processes through a multiprocessing.Event that's created when the pool starts,
+        so cancelling in the calling process reaches runs in progress in every worker.
+    """
+
+    def __init__(self, timeout=None, signals=()):
+        self._deadline = None if timeout is None else time.time() + timeout
+        self._signals = tuple(signals)
+        self._cancelled = False
+        self._event = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_event'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # in a pool worker, listen to the Event shared by the calling process
+        self._event = _worker_event
+
+    def cancel(self):
+        """
+            Cancel the search.
+        """
+        self._cancelled = True
+        if self._event is not None:
+            self._event.set()
+
+    def cancelled(self):
+        """
+            Return True if the search has been cancelled.
+        """
+        if not self._cancelled:
+            if self._deadline is not None and time.time() >= self._deadline:
+                self._cancelled = True
+            elif self._event is not None and self._event.is_set():
+                self._cancelled = True
+        return self._cancelled
+
+    def _share(self, mp_context=None):
+        """
+            Create the Event used to pass cancellation on to pool workers and return it; it's handed to each worker by _initialize_worker().
+        """
+        if self._event is None:
+            self._event = (mp_context or multiprocessing).Event()
+            if self._cancelled:
+                self._event.set()
+        return self._event
+
+    @contextmanager
+    def _handling_signals(self):
+        """
+            Cancel the token when one of its signals is received in this block. The first signal cancels; the previous handlers are put
+            back right away, so a second signal behaves as usual (e.g., raises KeyboardInterrupt). Signal handlers can only be installed in
+            the main thread; elsewhere, this does nothing.
+        """
+        if not self._signals or threading.current_thread() is not threading.main_thread():
+            yield
+            return
+        previous_handlers = dict()
+
+        def handler(signum, frame):
+            self.cancel()
+            for s, previous_handler in previous_handlers.items():
+                signal.signal(s, previous_handler)
+
+        for s in self._signals:
+            previous_handlers[s] = signal.signal(s, handler)
+        try:
+            yield
+        finally:
+            for s, previous_handler in previous_handlers.items():
+                signal.signal(s, previous_handler)
+
+
+def _initialize_worker(event=None):
+    """
+        Initializer of pool worker processes. Ctrl-C sends SIGINT to the whole process group, so without this every idle worker would die
+        with its own KeyboardInterrupt traceback and break the pool; instead, only the calling process reacts to it (and passes it on
+        through event if it's cancelling a CancellationToken).
+    """
+    global _worker_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_event = event
@@ -0,0 +1,164 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import argparse
+from datetime import datetime
+import importlib
+import json
+from multiprocessing import cpu_count
+import os
+import signal
+import sys
+
+from .cancellation import CancellationToken
+from .harmony_search import harmony_search, harmony_search_serial, harmony_search_batched, harmony_search_racing
+from .sweep import TunedObjectiveFunction
+
+# Command-line batch runner. A search is described by a JSON (or, with Python 3.11+ or the tomli package, TOML) config file:
+#
+#     {
+#         "objective": "mypackage.objectives:ObjectiveFunction",
+#         "objective_args": {"dimensions": 10},
+#         "settings": {"hms": 50, "max_imp": 100000},
+#         "backend": "parallel",
+#         "num_processes": 8,
+#         "num_iterations": 32,
+#         "timeout": 3600,
+#         "options": {"initializer": "latin_hypercube", "segment_size": 5000}
+#     }
+#
+# objective is the import path of an objective function (a class or other callable, which is called with objective_args, or an
+# instance). settings override its HS settings (see TunedObjectiveFunction). backend is one of BACKENDS. options are passed on to the
+# driver, and from there to HarmonySearch. After timeout seconds, or on SIGINT/SIGTERM, the search is cancelled and the partial results
+# are reported. Every value can be overridden on the command line.
+#
+# Output is written as JSON lines: a "start" event, a "run" event for each run as soon as it finishes, and a final "summary" event.
+
+BACKENDS = {
+    'serial': lambda objective_function, num_processes, num_iterations, **kwargs: harmony_search_serial(objective_function, num_iterations, **kwargs),
+    'parallel': harmony_search,
+    'batched': lambda objective_function, num_processes, num_iterations, **kwargs: harmony_search_batched(objective_function, num_iterations, **kwargs),
+    'racing': harmony_search_racing,
+}
+
+
+def main(argv=None):
+    """
+        Entry point of the pyharmonysearch command. Return the exit status: 0 if at least one run finished, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(prog='pyharmonysearch', description='Run harmony searches described by a JSON or TOML config file and '
+                                     'write progress and results as JSON lines.')
+    parser.add_argument('config', nargs='?', help='JSON or TOML (.toml) config file')
+    parser.add_argument('--objective', help='import path of the objective function, e.g., mymodule:ObjectiveFunction')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), help='how to run the searches (default: parallel)')
+    parser.add_argument('--num-processes', type=int, help='number of processes (default: number of CPUs)')
+    parser.add_argument('--num-iterations', type=int, help='number of runs (default: number of processes)')
+    parser.add_argument('--timeout', type=float, help='cancel the search after this many seconds and report partial results')
+    parser.add_argument('--output', help='write JSON lines to this file instead of stdout (appends)')
+    args = parser.parse_args(argv)
+
+    config = dict()
+    if args.config is not None:
+        try:
+            config = load_config(args.config)
+        except (OSError, ValueError) as e:
+            parser.error('cannot read config {}: {}'.format(args.config, e))
+    for key in ('objective', 'backend', 'num_processes', 'num_iterations', 'timeout', 'output'):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+    if 'objective' not in config:
+        parser.error('no objective function given (use --objective or set "objective" in the config)')
+    backend = config.get('backend', 'parallel')
+    if backend not in BACKENDS:
+        parser.error('unknown backend {!r}; expected one of {}'.format(backend, ', '.join(sorted(BACKENDS))))
+    try:
+        objective_function = load_objective(config['objective'], config.get('objective_args'))
+    except (ImportError, AttributeError, ValueError) as e:
+        parser.error('cannot load objective function {}: {}'.format(config['objective'], e))
+    if config.get('settings'):
+        objective_function = TunedObjectiveFunction(objective_function, config['settings'])
+    num_processes = config.get('num_processes') or cpu_count()
+    num_iterations = config.get('num_iterations') or num_processes
+
+    output = open(config['output'], 'a') if config.get('output') else sys.stdout
+    try:
+        def emit(event, **fields):
+            line = {'event': event, 'time': datetime.now().isoformat()}
+            line.update(fields)
+            output.write(json.dumps(line, default=str) + '\n')
+            output.flush()
+
+        def report_run(i, result):
+            best_harmony, best_fitness, _, _, statistics = result
+            emit('run', run=i, best_harmony=best_harmony, best_fitness=best_fitness, evaluations=statistics['evaluations'],
+                 failed_evaluations=statistics['failed_evaluations'], cancelled=statistics['cancelled'])
+
+        emit('start', objective=config['objective'], backend=backend, num_processes=num_processes, num_iterations=num_iterations,
+             settings=config.get('settings', dict()), options=config.get('options', dict()))
+        cancellation = CancellationToken(timeout=config.get('timeout'), signals=(signal.SIGINT, signal.SIGTERM))
+        results = BACKENDS[backend](objective_function, num_processes, num_iterations, cancellation=cancellation, callback=report_run,
+                                    **config.get('options', dict()))
+        emit('summary', elapsed_time=results.elapsed_time.total_seconds(), best_harmony=results.best_harmony,
+             best_fitness=results.best_fitness, runs=len(results.harmony_memories), failed_runs=results.failed_runs,
+             cancelled_runs=results.cancelled_runs, evaluations=results.evaluations, failed_evaluations=results.failed_evaluations,
+             utilization=results.utilization, elites=results.elites)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0 if results.harmony_memories else 1
+
+
+def load_config(path):
+    """
+        Read a config file; files ending in .toml are parsed as TOML, everything else as JSON.
+    """
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ValueError('TOML configs need Python 3.11 or the tomli package')
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_objective(import_path, objective_args=None):
+    """
+        Load an objective function given as 'module:name'. If name refers to a class (or another factory), it's called with
+        objective_args as keyword arguments; otherwise, it's used as is. The current directory is importable, as with python -m.
+    """
+    module_name, _, name = import_path.partition(':')
+    if not module_name or not name:
+        raise ValueError("expected 'module:name'")
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    objective_function = getattr(importlib.import_module(module_name), name)
+    if isinstance(objective_function, type) or (callable(objective_function) and not hasattr(objective_function, 'get_fitness')):
+        objective_function = objective_function(**(objective_args or dict()))
+    elif objective_args:
+        raise ValueError('objective_args given, but {} is not callable'.format(import_path))
+    return objective_function
@@ -0,0 +1,145 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from array import array
+
+# Compact result objects. By default, every run's harmony memory and history come back as lists of (list, float) tuples, which
+# take dozens of bytes per value once every float is boxed. With compact='double' (or 'single'), a driver instead returns them as
+# CompactMemory and CompactHistory objects that keep the values in typed arrays of C doubles (or floats, halving the size again at the
+# cost of precision) and only decode a harmony or generation when it's accessed. Pickling an array is a single copy of its buffer,
+# which makes them cheap to send, save (e.g., with pickle.dump()), and load. Fitness values are always kept as doubles.
+#
+# harmony_search() (without segment_size) builds them in the worker that did the run, so they're also what gets pickled back to the
+# parent. Segmented and racing runs are continued from the parent, which has to hold the full HarmonySearch between segments or
+# rounds anyway, so their compact objects are built in the parent once the run is over; that saves the parent's memory, but not IPC.
+#
+# As with HarmonyHistoryStore, every value a harmony can take must be convertible with float(), and values come back as floats.
+PRECISIONS = {'double': 'd', 'single': 'f'}
+
+
+def check_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision {!r}; expected 'double' or 'single'.".format(precision))
+
+
+class CompactMemory(object):
+
+    """
+        A harmony memory stored in typed arrays, column by column (each parameter for all harmonies). It behaves like the list of
+        (harmony, fitness) tuples it was built from, but each harmony is only decoded when it's indexed.
+    """
+
+    def __init__(self, harmony_memory, precision='double'):
+        check_precision(precision)
+        harmony_memory = list(harmony_memory)
+        self._hms = len(harmony_memory)
+        self._num_parameters = len(harmony_memory[0][0]) if self._hms else 0
+        self._values = array(PRECISIONS[precision])
+        for j in range(self._num_parameters):
+            self._values.extend(float(harmony[j]) for harmony, _ in harmony_memory)
+        self._fitnesses = array('d', [fitness for _, fitness in harmony_memory])
+
+    def __len__(self):
+        return self._hms
+
+    def __iter__(self):
+        for i in range(self._hms):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._hms))]
+        if index < 0:
+            index += self._hms
+        if not 0 <= index < self._hms:
+            raise IndexError('harmony index out of range')
+        return self._values[index::self._hms].tolist(), self._fitnesses[index]
+
+    def get_parameter(self, j):
+        """
+            Return the values of parameter j for all harmonies without decoding the rest of the memory.
+        """
+        return self._values[j * self._hms:(j + 1) * self._hms].tolist()
+
+    def get_fitnesses(self):
+        return self._fitnesses.tolist()
+
+    def to_list(self):
+        """
+            Return the memory in the usual format, a list of (harmony, fitness) tuples.
+        """
+        columns = [self.get_parameter(j) for j in range(self._num_parameters)]
+        harmonies = [list(harmony) for harmony in zip(*columns)] if columns else [list() for _ in range(self._hms)]
+        return list(zip(harmonies, self._fitnesses.tolist()))
+
+
+class CompactHistory(object):
+
+    """
+        A harmony history stored as one CompactMemory per generation. It behaves like the list of {'gen': ..., 'harmonies': ...}
+        dictionaries it was built from (and like RunHistory), but each generation is only decoded when it's indexed.
+    """
+
+    def __init__(self, harmony_history, precision='double'):
+        check_precision(precision)
+        self._generations = array('q', [generation['gen'] for generation in harmony_history])
+        self._memories = [CompactMemory(generation['harmonies'], precision) for generation in harmony_history]
+
+    def __len__(self):
+        return len(self._memories)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {'gen': self._generations[index], 'harmonies': self._memories[index].to_list()}
+
+    def memory(self, index):
+        """
+            Return the harmony memory of the given generation as a CompactMemory, without decoding it.
+        """
+        return self._memories[index]
+
+    def get_parameter(self, index, j):
+        return self._memories[index].get_parameter(j)
+
+    def get_fitnesses(self, index):
+        return self._memories[index].get_fitnesses()
+
+    def to_list(self):
+        """
+            Return the history in the usual format, a list of {'gen': ..., 'harmonies': ...} dictionaries.
+        """
+        return [self[i] for i in range(len(self))]
+
+
+def to_lists(results):
+    """
+        Return a copy of HarmonySearchResults in which compact memories and histories have been converted to the usual lists.
+    """
+    return results._replace(
+        harmony_memories=[memory.to_list() if isinstance(memory, CompactMemory) else memory for memory in results.harmony_memories],
+        harmony_histories=[history.to_list() if isinstance(history, CompactHistory) else history for history in results.harmony_histories])
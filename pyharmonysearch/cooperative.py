@@ -0,0 +1,384 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from datetime import datetime
+import random
+
+from .harmony_search import HarmonySearchResults, _create_search, _run_tasks, _merge_utilization, _handling_signals, \
+    _overrides_fitness_delta
+from .initialization import get_initializer
+from .objective_function_interface import ObjectiveFunctionInterface
+
+# Cooperative coevolution (CC) for problems with thousands of variables. The variables are split into groups, and each group is
+# optimized by its own HarmonySearch, whose harmonies only hold that group's variables. To evaluate them, they're plugged into the
+# context vector, the best complete harmony found so far. The search proceeds in cycles; in each cycle, every group gets a share of the
+# improvisations, and whenever a group finds a better assignment of its variables, the context vector is updated.
+#
+# Groups are formed in one of these ways (grouping):
+#
+# * 'fixed': consecutive variables are grouped, group_size at a time. Each group keeps its harmony memory between cycles (re-evaluated
+#   against the new context vector at the start of each cycle).
+# * 'random': the variables are shuffled into new groups of group_size every cycle (random grouping), so that interacting variables
+#   end up in the same group from time to time. Group memories start afresh every cycle.
+# * 'detect': interacting variables are detected with differential grouping before the search starts, and each set of interacting
+#   variables becomes a group; the remaining, separable variables are grouped group_size at a time. This costs on the order of n^2 / 2
+#   evaluations for n variables, which is only affordable with a cheap get_fitness_delta() (see ObjectiveFunctionInterface).
+# * a list of lists of parameter indices, for groups known in advance.
+#
+# See M. N. Omidvar, X. Li, Y. Mei, and X. Yao, "Cooperative co-evolution with differential grouping for large scale optimization",
+# IEEE Transactions on Evolutionary Computation, vol. 18, no. 3, pp. 378-393, 2014, and Z. Yang, K. Tang, and X. Yao, "Large scale
+# evolutionary optimization using cooperative coevolution", Information Sciences, vol. 178, no. 15, pp. 2985-2999, 2008.
+
+GROUPINGS = ('fixed', 'random', 'detect')
+
+
+class GroupObjectiveFunction(ObjectiveFunctionInterface):
+
+    """
+        The objective function of one group: harmonies hold the values of the group's parameters (indices), and their fitness is the
+        fitness of the context vector with those values plugged in. If the full objective function implements get_fitness_delta(), only
+        the parameters that differ from the context vector are passed to it.
+
+        The HS settings are those of the full objective function, except for max_imp (the group's improvisations per cycle) and the
+        random seed, which the CC driver takes care of.
+    """
+
+    def __init__(self, objective_function, indices, context, context_fitness, max_imp):
+        self._objective_function = objective_function
+        self._indices = list(indices)
+        self._context = context
+        self._context_fitness = context_fitness
+        self._max_imp = max_imp
+        self._delta = _overrides_fitness_delta(objective_function)
+
+    def expand(self, harmony):
+        """
+            Return the context vector with the given group harmony plugged in.
+        """
+        vector = list(self._context)
+        for i, value in zip(self._indices, harmony):
+            vector[i] = value
+        return vector
+
+    def get_fitness(self, vector):
+        if self._delta:
+            changed = [(i, value) for i, value in zip(self._indices, vector) if value != self._context[i]]
+            return self._objective_function.get_fitness_delta(self._context, self._context_fitness, [i for i, _ in changed],
+                                                              [value for _, value in changed])
+        return self._objective_function.get_fitness(self.expand(vector))
+
+    def get_fitness_batch(self, vectors):
+        if self._delta:
+            return [self.get_fitness(vector) for vector in vectors]
+        return self._objective_function.get_fitness_batch([self.expand(vector) for vector in vectors])
+
+    def get_value(self, i, j=None):
+        return self._objective_function.get_value(self._indices[i], j)
+
+    def get_index(self, i, v):
+        return self._objective_function.get_index(self._indices[i], v)
+
+    def get_num_discrete_values(self, i):
+        return self._objective_function.get_num_discrete_values(self._indices[i])
+
+    def get_lower_bound(self, i):
+        return self._objective_function.get_lower_bound(self._indices[i])
+
+    def get_upper_bound(self, i):
+        return self._objective_function.get_upper_bound(self._indices[i])
+
+    def is_variable(self, i):
+        return True
+
+    def is_discrete(self, i):
+        return self._objective_function.is_discrete(self._indices[i])
+
+    def get_num_parameters(self):
+        return len(self._indices)
+
+    def use_random_seed(self):
+        return False
+
+    def get_max_imp(self):
+        return self._max_imp
+
+    def get_hmcr(self):
+        return self._objective_function.get_hmcr()
+
+    def get_par(self):
+        return self._objective_function.get_par()
+
+    def get_hms(self):
+        return self._objective_function.get_hms()
+
+    def get_mpai(self):
+        return self._objective_function.get_mpai()
+
+    def get_mpap(self):
+        return self._objective_function.get_mpap()
+
+    def maximize(self):
+        return self._objective_function.maximize()
+
+
+def harmony_search_cooperative(objective_function, num_cycles, grouping='random', group_size=50, num_processes=None, mp_context=None,
+                               max_run_retries=2, interaction_threshold=None, cancellation=None, **kwargs):
+    """
+        Optimize a high-dimensional objective function with cooperative coevolution (see the top of this module). max_imp is the total
+        number of improvisations, which are split evenly over num_cycles cycles and all groups. grouping is 'fixed', 'random', 'detect',
+        or a list of lists of parameter indices; group_size is the size of the groups formed by the first three. interaction_threshold is
+        the smallest difference that counts as an interaction for 'detect'; by default, it's a tiny fraction of the fitness values
+        involved, so only rounding errors are ignored.
+
+        Without num_processes, groups take turns, and each group is optimized with the context vector as improved by the groups before
+        it. With num_processes, the groups of a cycle are optimized simultaneously on a pool of processes (see ``harmony_search`` for
+        mp_context and max_run_retries), all starting from the same context vector. Their improvements are then combined, which works
+        well as long as the groups don't interact; if the combined context vector turns out worse than the best single improvement, only
+        that one is kept. A group whose optimization fails is skipped for that cycle.
+
+        Return HarmonySearchResults for a single run: best_harmony is the final context vector, harmony_memories holds it as a one-harmony
+        memory, and harmony_histories holds the context vector at the end of every cycle. cancellation (a CancellationToken) stops the
+        search after the current group or cycle. Any additional keyword arguments are passed on to the groups' HarmonySearch; an archive
+        can't be used, since the fitness of a group harmony depends on the context vector, and neither can multi_fidelity, since group
+        harmonies are evaluated against the full-fidelity fitness of the context vector.
+    """
+    if 'archive' in kwargs:
+        raise ValueError('harmony_search_cooperative does not support an archive.')
+    if kwargs.get('multi_fidelity'):
+        raise ValueError('multi_fidelity cannot be combined with harmony_search_cooperative().')
+    if not isinstance(grouping, (list, tuple)) and grouping not in GROUPINGS:
+        raise ValueError('grouping must be one of {} or a list of groups.'.format(', '.join(GROUPINGS)))
+    if group_size < 1:
+        raise ValueError('group_size must be at least 1.')
+    kwargs['record_history'] = False  # group histories aren't part of the results
+    start = datetime.now()
+    if objective_function.use_random_seed():
+        random.seed(objective_function.get_random_seed())
+    maximize = objective_function.maximize()
+    evaluations = 0
+
+    # the initial context vector is the best of hms harmonies from the initializer
+    candidates = get_initializer(kwargs.get('initializer', 'random'))(objective_function, objective_function.get_hms())
+    fitnesses = objective_function.get_fitness_batch(candidates)
+    evaluations += len(candidates)
+    best = max(range(len(candidates)), key=lambda k: fitnesses[k]) if maximize else min(range(len(candidates)), key=lambda k: fitnesses[k])
+    context, context_fitness = list(candidates[best]), fitnesses[best]
+
+    variables = [i for i in range(objective_function.get_num_parameters()) if objective_function.is_variable(i)]
+    if isinstance(grouping, (list, tuple)):
+        groups = [list(group) for group in grouping]
+    elif grouping == 'detect':
+        groups, detect_evaluations = detect_groups(objective_function, group_size, interaction_threshold)
+        evaluations += detect_evaluations
+    else:
+        groups = _chunks(variables, group_size)
+    searches = dict()
+
+    def better(fitness, other):
+        return fitness > other if maximize else fitness < other
+
+    history = list()
+    utilization = None
+    with _handling_signals(cancellation):
+        for cycle in range(num_cycles):
+            if cancellation is not None and cancellation.cancelled():
+                break
+            if grouping == 'random':
+                shuffled = list(variables)
+                random.shuffle(shuffled)
+                groups = _chunks(shuffled, group_size)
+                searches = dict()
+            group_imp = max(1, objective_function.get_max_imp() // (num_cycles * max(1, len(groups))))
+            if num_processes is None:
+                for g, group in enumerate(groups):
+                    if cancellation is not None and cancellation.cancelled():
+                        break
+                    group_objective = GroupObjectiveFunction(objective_function, group, context, context_fitness, group_imp)
+                    hs = searches.get(g) or _create_search(group_objective, cancellation=cancellation, **kwargs)
+                    hs, harmony, fitness, num_evaluations = _optimize_group(hs, group_objective, random.getrandbits(64))
+                    searches[g] = hs
+                    evaluations += num_evaluations
+                    if better(fitness, context_fitness):
+                        context, context_fitness = group_objective.expand(harmony), fitness
+            else:
+                group_objectives = [GroupObjectiveFunction(objective_function, group, context, context_fitness, group_imp) for group in groups]
+                seeds = [random.getrandbits(64) for _ in groups]
+                # one task per process, so that the context vector is sent once per process rather than once per group
+                batches = [list(range(p, len(groups), num_processes)) for p in range(min(num_processes, len(groups)))]
+                tasks = [(_optimize_groups, (objective_function, context, context_fitness, group_imp,
+                                             [(groups[g], searches.get(g), seeds[g]) for g in batch], cancellation, kwargs), dict())
+                         for batch in batches]
+                results, _, cycle_utilization = _run_tasks(num_processes, tasks, max_run_retries, mp_context=mp_context,
+                                                           cancellation=cancellation)
+                utilization = _merge_utilization(utilization, cycle_utilization)
+                improvements = list()
+                for batch, batch_results in zip(batches, results):
+                    if batch_results is None:
+                        continue
+                    for g, (hs, harmony, fitness, num_evaluations) in zip(batch, batch_results):
+                        searches[g] = hs
+                        evaluations += num_evaluations
+                        if better(fitness, context_fitness):
+                            improvements.append((g, harmony, fitness))
+                if improvements:
+                    best_improvement = improvements[0]
+                    for improvement in improvements[1:]:
+                        if better(improvement[2], best_improvement[2]):
+                            best_improvement = improvement
+                    combined = list(context)
+                    for g, harmony, _ in improvements:
+                        for i, value in zip(groups[g], harmony):
+                            combined[i] = value
+                    if len(improvements) > 1:
+                        combined_fitness = objective_function.get_fitness(combined)
+                        evaluations += 1
+                    else:
+                        combined_fitness = best_improvement[2]
+                    if better(combined_fitness, best_improvement[2]) or combined_fitness == best_improvement[2]:
+                        context, context_fitness = combined, combined_fitness
+                    else:
+                        context, context_fitness = group_objectives[best_improvement[0]].expand(best_improvement[1]), best_improvement[2]
+            history.append({'gen': cycle + 1, 'harmonies': [(list(context), context_fitness)]})
+
+    elapsed_time = datetime.now() - start
+    return HarmonySearchResults(elapsed_time=elapsed_time, best_harmony=context, best_fitness=context_fitness,
+                                harmony_memories=[[(context, context_fitness)]], harmony_histories=[history], evaluations=evaluations,
+                                diversity_traces=[list()], cancelled_runs=1 if len(history) < num_cycles else 0, utilization=utilization,
+                                elites=[(context, context_fitness)])
+
+
+def _optimize_group(hs, group_objective, seed):
+    """
+        Do one cycle of a group's HarmonySearch against the current context vector (given by group_objective) and return the search,
+        the best group harmony and its fitness, and the number of evaluations used. A group's memory from earlier cycles is re-evaluated
+        first, and the group's part of the context vector is always kept in memory, so a group never does worse than the context vector.
+        The random module is seeded with seed, so results don't depend on which process a group runs in.
+    """
+    random.seed(seed)
+    hs._random_state = None
+    before = hs._num_evaluations
+    context_harmony = [group_objective._context[i] for i in group_objective._indices]
+    if not hs._started():
+        hs._obj_fun = group_objective
+        candidates, harmonies = hs._initial_candidates()
+        candidates.extend(zip(harmonies, hs._evaluate_batch(harmonies)))
+    else:
+        hs._obj_fun = group_objective
+        harmonies = [harmony for harmony, _ in hs._harmony_memory if harmony != context_harmony]
+        candidates = list(zip(harmonies, hs._evaluate_batch(harmonies, use_cache=False)))
+    # replace the worst candidate by the group's part of the context vector, whose fitness is already known
+    candidates.sort(key=lambda candidate: candidate[1], reverse=group_objective.maximize())
+    candidates = candidates[:group_objective.get_hms() - 1] + [(context_harmony, group_objective._context_fitness)]
+    hs._fill_memory(candidates)
+    hs._improvise(group_objective.get_max_imp())
+    harmony, fitness = hs._best()
+    return hs, harmony, fitness, hs._num_evaluations - before
+
+
+def _optimize_groups(objective_function, context, context_fitness, group_imp, groups, cancellation, kwargs):
+    """
+        Run _optimize_group() for several groups of a cycle in one worker task. groups is a list of (indices, hs, seed) tuples, where hs
+        is None for a group that doesn't have a search yet, so that only the group's indices and harmony memory are sent along with the
+        one context vector. Return a list of what _optimize_group() returns for each group. The searches are sent back without their
+        objective function, which holds the context vector; _optimize_group() gives them the next cycle's.
+    """
+    results = list()
+    for indices, hs, seed in groups:
+        group_objective = GroupObjectiveFunction(objective_function, indices, context, context_fitness, group_imp)
+        if hs is None:
+            hs = _create_search(group_objective, cancellation=cancellation, **kwargs)
+        hs, harmony, fitness, num_evaluations = _optimize_group(hs, group_objective, seed)
+        hs._obj_fun = None
+        results.append((hs, harmony, fitness, num_evaluations))
+    return results
+
+
+def detect_groups(objective_function, group_size=50, threshold=None):
+    """
+        Differential grouping: return groups of interacting variable parameters and the number of evaluations used. Starting with all
+        parameters at their lowest values, parameters i and j interact if the change in fitness caused by moving i to its highest value
+        is different when j is moved to the middle of its range. Each parameter is checked against all parameters not grouped yet;
+        parameters that don't interact with any other are grouped group_size at a time.
+    """
+    num_parameters = objective_function.get_num_parameters()
+    variables = [i for i in range(num_parameters) if objective_function.is_variable(i)]
+    low = dict()
+    high = dict()
+    middle = dict()
+    for i in variables:
+        if objective_function.is_discrete(i):
+            num_values = objective_function.get_num_discrete_values(i)
+            low[i] = objective_function.get_value(i, 0)
+            high[i] = objective_function.get_value(i, num_values - 1)
+            middle[i] = objective_function.get_value(i, num_values // 2)
+        else:
+            low[i] = objective_function.get_lower_bound(i)
+            high[i] = objective_function.get_upper_bound(i)
+            middle[i] = (low[i] + high[i]) / 2.0
+    base = [low[i] if i in low else objective_function.get_value(i) for i in range(num_parameters)]
+    delta = _overrides_fitness_delta(objective_function)
+    evaluations = [0]
+
+    def fitness(changed, values):
+        evaluations[0] += 1
+        if delta:
+            return objective_function.get_fitness_delta(base, base_fitness, changed, values)
+        vector = list(base)
+        for i, value in zip(changed, values):
+            vector[i] = value
+        return objective_function.get_fitness(vector)
+
+    base_fitness = objective_function.get_fitness(base)
+    evaluations[0] += 1
+    moved = dict()  # fitness with i moved to its highest value
+    centered = dict()  # fitness with j moved to the middle of its range
+    groups = list()
+    separable = list()
+    remaining = list(variables)
+    while remaining:
+        i = remaining.pop(0)
+        if i not in moved:
+            moved[i] = fitness([i], [high[i]])
+        group = [i]
+        rest = list()
+        for j in remaining:
+            if j not in centered:
+                centered[j] = fitness([j], [middle[j]])
+            both = fitness([i, j], [high[i], middle[j]])
+            difference = abs((moved[i] - base_fitness) - (both - centered[j]))
+            limit = threshold if threshold is not None else \
+                1e-9 * (abs(base_fitness) + abs(moved[i]) + abs(centered[j]) + abs(both)) + 1e-12
+            if difference > limit:
+                group.append(j)
+            else:
+                rest.append(j)
+        remaining = rest
+        if len(group) > 1:
+            groups.append(group)
+        else:
+            separable.append(i)
+    return groups + _chunks(separable, group_size), evaluations[0]
+
+
+def _chunks(indices, size):
+    return [indices[k:k + size] for k in range(0, len(indices), size)]
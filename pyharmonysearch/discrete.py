@@ -0,0 +1,223 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from array import array
+import random
+
+from .harmony_search import HarmonySearch
+
+# An engine for problems whose variable parameters are all discrete (e.g., combinatorial problems). Instead of lists of arbitrary
+# values, harmony_memory holds one compact array of value indices per harmony, using the smallest unsigned type that fits every
+# parameter's number of values (so usually a byte or two per note). Improvisation works on indices only: memory consideration copies
+# an index, pitch adjustment is index arithmetic, and random selection picks a uniformly random index. Each new harmony is decoded into
+# values once, through tables built with get_value(i, j) when the search is created, to be evaluated.
+#
+# Duplicate detection uses Zobrist hashing: every (parameter, index) pair gets a random 64-bit key, and the hash of a harmony is the XOR
+# of the keys of its notes. The hash is built up note by note as a harmony is improvised, and a dictionary from hashes to memory slots
+# makes checking whether a harmony is already in memory O(1) instead of a comparison with every harmony in memory.
+
+
+class DiscreteHarmonySearch(HarmonySearch):
+
+    """
+        A HarmonySearch for objective functions whose variable parameters are all discrete. It takes the same arguments and returns the
+        same results as HarmonySearch, and can be used with the drivers by passing engine=DiscreteHarmonySearch (e.g., to
+        harmony_search()). Compared to HarmonySearch, it uses far less memory per harmony, and far less CPU per improvisation since
+        get_index() and get_value() are never called while improvising.
+
+        Differences from HarmonySearch:
+
+        * random selection picks one of a parameter's get_num_discrete_values(i) values uniformly rather than calling get_value(i),
+        * a parameter that isn't variable always takes the value get_value(i) returned when the search was created,
+        * a harmony is a duplicate of one in memory if its values are the same, regardless of its fitness, and
+        * get_fitness_delta() isn't used.
+    """
+
+    # seed for the Zobrist keys, which only need to be random-looking and are kept independent of the random module
+    _ZOBRIST_SEED = 0x5eed
+
+    def __init__(self, objective_function, **kwargs):
+        HarmonySearch.__init__(self, objective_function, **kwargs)
+        self._build_tables()
+
+    def objective_changed(self, objective_function=None, fresh_fraction=0.2):
+        HarmonySearch.objective_changed(self, objective_function, fresh_fraction)
+        if objective_function is not None:
+            self._build_tables()
+        self._harmony_memory = _IndexMemory(self, self._harmony_memory)
+    objective_changed.__doc__ = HarmonySearch.objective_changed.__doc__
+
+    def _build_tables(self):
+        """
+            Build the value table (the values of each parameter in index order) and the Zobrist keys of every parameter, and choose the
+            array type used for harmonies.
+        """
+        obj_fun = self._obj_fun
+        rng = random.Random(self._ZOBRIST_SEED)
+        self._values = list()
+        self._sizes = list()  # the number of values of each variable parameter, or 0 if it isn't variable
+        self._zobrist = list()
+        for i in range(obj_fun.get_num_parameters()):
+            if not obj_fun.is_variable(i):
+                self._values.append([obj_fun.get_value(i)])
+                self._sizes.append(0)
+            elif obj_fun.is_discrete(i):
+                size = obj_fun.get_num_discrete_values(i)
+                self._values.append([obj_fun.get_value(i, j) for j in range(size)])
+                self._sizes.append(size)
+            else:
+                raise ValueError('DiscreteHarmonySearch requires all variable parameters to be discrete (parameter {} is not).'.format(i))
+            self._zobrist.append(array('Q', [rng.getrandbits(64) for _ in self._values[-1]]))
+        largest = max([len(values) for values in self._values] or [1])
+        self._typecode = 'B' if largest <= 1 << 8 else 'H' if largest <= 1 << 16 else 'L'
+        self._improvised = None
+
+    def _fill_memory(self, candidates):
+        HarmonySearch._fill_memory(self, candidates)
+        self._harmony_memory = _IndexMemory(self, self._harmony_memory)
+
+    def _new_harmony(self):
+        """
+            Improvise a new harmony, working on value indices only (see the comment at the top of discrete.py). The harmony's index array
+            and hash are kept in _improvised, so that they don't have to be computed again if the harmony enters harmony_memory.
+        """
+        rand = random.random
+        hmcr = self._hmcr
+        par = self._par
+        mpai = self._mpai
+        rows = self._harmony_memory.rows
+        hms = len(rows)
+        selection = self._selection
+        sizes = self._sizes
+        zobrist = self._zobrist
+        indices = list()
+        key = 0
+        for i in range(self._num_parameters):
+            size = sizes[i]
+            if rand() < hmcr:
+                j = rows[selection.sample() if selection is not None else int(rand() * hms)][i]
+                if rand() < par and size:
+                    # same as HarmonySearch._pitch_adjustment(), but without the get_index()/get_value() round trip
+                    if rand() < 0.5:
+                        j -= int(rand() * (min(mpai, j) + 1))
+                    else:
+                        j += int(rand() * (min(mpai, size - j - 1) + 1))
+            else:
+                j = int(rand() * size)
+            indices.append(j)
+            key ^= zobrist[i][j]
+        values = self._values
+        harmony = [values[i][j] for i, j in enumerate(indices)]
+        self._improvised = (harmony, array(self._typecode, indices), key)
+        return harmony
+
+    def _encode(self, harmony):
+        """
+            Return the index array and Zobrist hash of a harmony given by its values.
+        """
+        if self._improvised is not None and self._improvised[0] is harmony:
+            return self._improvised[1], self._improvised[2]
+        indices = list()
+        key = 0
+        for i, value in enumerate(harmony):
+            j = self._obj_fun.get_index(i, value) if self._sizes[i] else 0
+            indices.append(j)
+            key ^= self._zobrist[i][j]
+        return array(self._typecode, indices), key
+
+    def _decode(self, row):
+        values = self._values
+        return [values[i][j] for i, j in enumerate(row)]
+
+    def _best(self):
+        return self._extreme(self._obj_fun.maximize())
+
+    def _worst(self):
+        return self._extreme(not self._obj_fun.maximize(), decode=False)
+
+    def _extreme(self, highest, decode=True):
+        """
+            Return the harmony (or its index, if decode is False) with the highest or lowest fitness in harmony_memory and its fitness.
+            Only the fitness values are scanned, so this doesn't decode every harmony like HarmonySearch._best() and _worst() would.
+        """
+        fitnesses = self._harmony_memory.fitnesses
+        index = max(range(len(fitnesses)), key=fitnesses.__getitem__) if highest else min(range(len(fitnesses)), key=fitnesses.__getitem__)
+        return (self._decode(self._harmony_memory.rows[index]) if decode else index), fitnesses[index]
+
+    def _finish(self):
+        best_harmony, best_fitness, harmony_memory, harmony_history = HarmonySearch._finish(self)
+        return best_harmony, best_fitness, list(harmony_memory), harmony_history
+
+
+class _IndexMemory(object):
+
+    """
+        The harmony memory of a DiscreteHarmonySearch: a sequence of (harmony, fitness) tuples like HarmonySearch's harmony_memory, so
+        that everything working on that still works, but stored as index arrays (rows) and fitness values, along with a dictionary from
+        Zobrist hashes to the slots holding harmonies with that hash. Harmonies are decoded into values when they're read.
+    """
+
+    def __init__(self, search, harmony_memory):
+        self._search = search
+        self.rows = list()
+        self.fitnesses = list()
+        self._keys = list()
+        self._slots = dict()
+        for harmony, fitness in harmony_memory:
+            row, key = search._encode(harmony)
+            self.rows.append(row)
+            self.fitnesses.append(fitness)
+            self._keys.append(key)
+            self._slots.setdefault(key, list()).append(len(self.rows) - 1)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self._search._decode(self.rows[index]), self.fitnesses[index]
+
+    def __iter__(self):
+        for index in range(len(self.rows)):
+            yield self[index]
+
+    def __setitem__(self, index, item):
+        harmony, fitness = item
+        row, key = self._search._encode(harmony)
+        slots = self._slots[self._keys[index]]
+        slots.remove(index)
+        if not slots:
+            del self._slots[self._keys[index]]
+        self.rows[index] = row
+        self.fitnesses[index] = fitness
+        self._keys[index] = key
+        self._slots.setdefault(key, list()).append(index)
+
+    def __contains__(self, item):
+        harmony, _ = item
+        row, key = self._search._encode(harmony)
+        # harmonies with the same hash are compared in full, so hash collisions can't cause false positives
+        return any(self.rows[index] == row for index in self._slots.get(key, ()))
+
+    def __deepcopy__(self, memo):
+        # HarmonySearch._record_generation() deep-copies harmony_memory to snapshot it; the snapshot is a plain list of decoded harmonies
+        return list(self)
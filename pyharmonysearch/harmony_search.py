@@ -21,98 +21,747 @@
     THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
+import math
 import random
-from multiprocessing import Pool, Event
+import signal
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from collections import namedtuple
+from collections import namedtuple, Counter
+from contextlib import nullcontext
 import copy
+import heapq
 
-# Note: We use a global multiprocessing.Event to deal with a KeyboardInterrupt. This idea comes from
-# http://stackoverflow.com/questions/14579474/multiprocessing-pool-spawning-new-childern-after-terminate-on-linux-python2-7.
-# This is not necessary when running under Python 3, but to keep 2.7 compatability, I'm leaving it in.
-terminating = Event()
+from .cancellation import _initialize_worker
+from .compact import CompactMemory, CompactHistory, check_precision
+from .history import HarmonyHistoryStore
+from .initialization import get_initializer, opposite_harmony, random_harmonies
+from .local_search import pattern_search
+from .objective_function_interface import ObjectiveFunctionInterface
+from .selection import get_selection
 
 # HarmonySearchResults is a struct-like object that we'll use to attach the results of the search.
 # namedtuples are lightweight and trivial to extend should more results be desired in the future. Right now, we're just
 # keeping track of the total elapsed clock time, the best harmony found, the fitness for that harmony, and the harmony memory,
-# which allows you to see the top harmonies.
-HarmonySearchResults = namedtuple('HarmonySearchResults', ['elapsed_time', 'best_harmony', 'best_fitness', 'harmony_memories', 'harmony_histories'])
+# which allows you to see the top harmonies. failed_runs counts the runs that failed (and are therefore missing from harmony_memories and
+# harmony_histories), failed_evaluations counts the fitness evaluations that failed for good in the remaining runs, and evaluations counts
+# all calls to the objective function made by the remaining runs (cached fitness values aren't counted). If diversity was tracked,
+# diversity_traces holds a list of (num_imp, diversity) tuples for each run, recorded once per generation. If the search was cancelled (see
+# CancellationToken), cancelled_runs counts the runs that were cut short (these are included with their memories at the time) or never started.
+# For the drivers that use a process pool, utilization describes how busy the pool was (see _run_tasks()). With multi-fidelity screening,
+# evaluations only counts the (high-fidelity) get_fitness() calls, and low_fidelity_evaluations counts the low-fidelity ones. elites holds the
+# best distinct (harmony, fitness) tuples found by all runs together, best first (see ElitePool); harmony_memories holds None for each run
+# if the driver was asked not to return memories (keep_memories=False). With compact results (see compact.py), harmony_memories and
+# harmony_histories hold CompactMemory and CompactHistory objects instead of lists.
+HarmonySearchResults = namedtuple('HarmonySearchResults', ['elapsed_time', 'best_harmony', 'best_fitness', 'harmony_memories', 'harmony_histories',
+                                                           'failed_runs', 'failed_evaluations', 'evaluations', 'diversity_traces', 'cancelled_runs',
+                                                           'utilization', 'low_fidelity_evaluations', 'elites'],
+                                  defaults=(0, 0, 0, None, 0, None, 0, None))
 
 
-def harmony_search(objective_function, num_processes, num_iterations, initial_harmonies=None):
+class ElitePool(object):
+
+    """
+        A bounded set of the size best distinct harmonies seen, kept in a heap whose root is the worst of them, so adding a harmony
+        takes O(log size) time. Harmonies are distinct if their values differ (they must therefore be hashable as tuples); adding a
+        harmony that's already in the pool does nothing.
+    """
+
+    def __init__(self, size, maximize):
+        self._size = size
+        self._sign = 1 if maximize else -1
+        self._heap = list()
+        self._keys = set()
+        self._count = 0  # ties are broken by insertion order, so harmonies themselves are never compared
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, harmony, fitness):
+        key = tuple(harmony)
+        if self._size < 1 or key in self._keys:
+            return
+        entry = (self._sign * fitness, -self._count, key, fitness)
+        self._count += 1
+        if len(self._heap) < self._size:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            self._keys.discard(heapq.heapreplace(self._heap, entry)[2])
+        else:
+            return
+        self._keys.add(key)
+
+    def merge(self, elites):
+        for harmony, fitness in elites:
+            self.add(harmony, fitness)
+
+    def elites(self):
+        """
+            Return the (harmony, fitness) tuples in the pool, best first.
+        """
+        return [(list(key), fitness) for _, _, key, fitness in sorted(self._heap, reverse=True)]
+
+
+class EvaluationTimeout(Exception):
+
+    """
+        Raised when a single fitness evaluation takes longer than the evaluation_timeout given to HarmonySearch.
+    """
+    pass
+
+
+class RunTimeout(Exception):
+
+    """
+        Recorded as the error of a run (or segment) that was still running in a worker process after the run_timeout given to a parallel
+        driver, or that was stopped along with it.
     """
-        Here, we use multiprocessing.Pool to do multiple harmony searches simultaneously. Since HS is stochastic (unless random_seed is set),
+    pass
+
+
+def harmony_search(objective_function, num_processes, num_iterations, initial_harmonies=None, history_path=None, max_run_retries=2,
+                   mp_context=None, cancellation=None, segment_size=None, callback=None, num_elites=10, keep_memories=True,
+                   keep_histories=True, compact=None, run_timeout=None, **kwargs):
+    """
+        Here, we use a pool of processes to do multiple harmony searches simultaneously. Since HS is stochastic (unless random_seed is set),
         multiple runs can find different results. We run the specified number of iterations on the specified number of processes and return
         an instance of HarmonySearchResults.
+
+        If history_path is given, each run streams its history into a HarmonyHistoryStore at that path instead of keeping it in RAM,
+        and harmony_histories holds lazy RunHistory views of the stored runs.
+
+        A run that raises an exception, or that's running when a worker process crashes (e.g., a segfault in native code called by
+        get_fitness), is restarted up to max_run_retries times; crashed workers are replaced. Runs that still fail are left out of the
+        results and counted in failed_runs. Only if every run fails is the first error raised.
+
+        evaluation_timeout (see HarmonySearch) can't interrupt a get_fitness call that hangs in native code. To guard against that, pass
+        run_timeout: a run (or, with segment_size, a segment) that has been running for longer than run_timeout seconds is stopped from
+        this process by terminating the worker processes. Every run that was in progress at the time then counts a failed attempt (as
+        when a worker crashes) and is restarted on a new pool, up to max_run_retries times.
+
+        mp_context selects how worker processes are started: either the name of a start method ('fork', 'spawn', or 'forkserver') or a
+        context from multiprocessing.get_context(); by default, the platform's default start method is used. With 'spawn' and
+        'forkserver', the objective function (and its class) must be importable by the workers, i.e., defined in a module rather than in
+        the __main__ script run interactively, and the search must be started under an ``if __name__ == '__main__':`` guard. No
+        multiprocessing resources are created until a parallel search starts.
+
+        On a KeyboardInterrupt, which only the calling process handles, runs that haven't started are cancelled, the worker processes are
+        stopped, and the KeyboardInterrupt is raised again. To stop early without losing the runs in progress, pass a CancellationToken as
+        cancellation instead: once it's cancelled, runs in progress stop and return their current harmony memories, runs that haven't
+        started are skipped, and the results are built from what was done.
+
+        By default, each run is a single task, so when runs take very different amounts of time (e.g., because the cost of get_fitness
+        depends on where a run is searching), processes can sit idle while the last, slow runs finish. If segment_size is given, runs are
+        instead split into segments of segment_size improvisations, which are continued (from the pickled run) on whichever process is
+        free. The next segment always goes to the run with the most estimated work left, based on how fast its earlier segments went, so
+        that slow runs are kept going on all processes until the end. The cost is pickling each run once per segment, so segment_size
+        should be large enough that a segment takes well over a few milliseconds. utilization reports how busy the processes were.
+
+        If callback is given, it's called with the index of each run and its result as soon as the run finishes (e.g., to report progress).
+        The result is a (best_harmony, best_fitness, harmony_memory, harmony_history, statistics) tuple, where statistics is a dictionary
+        with the run's counters, including the run's best num_elites distinct harmonies ('elites'). An exception raised by callback stops
+        the search and is raised here, as it is by ``harmony_search_serial``.
+
+        The best num_elites distinct harmonies of all runs are merged into the elites of the results. If only those are needed, pass
+        keep_memories=False to leave each run's harmony memory out of the results (and out of what's sent back from the workers). The
+        histories are usually much larger still: pass keep_histories=False to not record them at all, which saves their RAM in the
+        workers, and the IPC of sending them back (with segment_size, after every segment) as well. To keep
+        them at a fraction of the memory, pass compact='double' or 'single' (float32) instead; memories and histories are then returned
+        as CompactMemory and CompactHistory objects (see compact.py), which to_lists() converts back. They're built in the workers,
+        except with segment_size, where runs are only converted in this process once they're over.
+
+        Any additional keyword arguments (e.g., initializer) are passed on to HarmonySearch. Pass engine=DiscreteHarmonySearch to use
+        that (faster, more compact) engine for objective functions whose variable parameters are all discrete.
     """
-    pool = Pool(num_processes)
-    try:
-        start = datetime.now()
-        pool_results = [pool.apply_async(worker, args=(objective_function, initial_harmonies,)) for i in range(num_iterations)]
-        pool.close()  # no more tasks will be submitted to the pool
-        pool.join()  # wait for all tasks to finish before moving on
-        end = datetime.now()
-        elapsed_time = end - start
+    if num_processes < 1:
+        raise ValueError('num_processes must be at least 1.')
+    if segment_size is not None and segment_size < 1:
+        raise ValueError('segment_size must be at least 1.')
+    if not keep_histories:
+        kwargs['record_history'] = False
+    if compact is not None:
+        check_precision(compact)
+    history_store = _create_history_store(objective_function, history_path)
+    start = datetime.now()
+    if segment_size is None:
+        kwargs['cancellation'] = cancellation
+        kwargs['num_elites'] = num_elites
+        kwargs['keep_memories'] = keep_memories
+        kwargs['compact'] = compact
+        tasks = [(worker, (objective_function, initial_harmonies, _history_writer(history_store, i)), kwargs) for i in range(num_iterations)]
+        with _handling_signals(cancellation):
+            results, errors, utilization = _run_tasks(num_processes, tasks, max_run_retries, callback=_run_callback(callback),
+                                                      mp_context=mp_context, cancellation=cancellation, timeout=run_timeout)
+        finished = [result for result in results if result is not None]
+    else:
+        finished, errors, utilization = _run_segments(objective_function, num_processes, num_iterations, initial_harmonies, history_store,
+                                                      segment_size, max_run_retries, mp_context, cancellation, callback, num_elites,
+                                                      keep_memories, compact, run_timeout, kwargs)
+    end = datetime.now()
+    elapsed_time = end - start
 
-        # find best harmony from all iterations
-        best_harmony = None
-        best_fitness = float('-inf') if objective_function.maximize() else float('+inf')
-        harmony_memories = list()
-        harmony_histories = list()
-        for result in pool_results:
-            harmony, fitness, harmony_memory, harmony_history = result.get()  # multiprocessing.pool.AsyncResult is returned for each process, so we need to call get() to pull out the value
-            if (objective_function.maximize() and fitness > best_fitness) or (not objective_function.maximize() and fitness < best_fitness):
-                best_harmony = harmony
-                best_fitness = fitness
-            harmony_memories.append(harmony_memory)
-            harmony_histories.append(harmony_history)
+    _raise_if_all_failed(finished, errors)
+    return _summarize(objective_function, finished, elapsed_time, failed_runs=len(errors),
+                      cancelled_runs=num_iterations - len(finished) - len(errors), utilization=utilization, num_elites=num_elites)
 
-        return HarmonySearchResults(elapsed_time=elapsed_time, best_harmony=best_harmony, best_fitness=best_fitness,\
-                                    harmony_memories=harmony_memories, harmony_histories=harmony_histories)
-    except KeyboardInterrupt:
-        pool.terminate()
-        raise
 
+def _run_callback(callback):
+    """
+        Adapt a per-run callback (see ``harmony_search``) to _run_tasks(), skipping runs that were never started.
+    """
+    if callback is None:
+        return None
+
+    def run_callback(i, result):
+        if result is not None:
+            callback(i, result)
+    return run_callback
+
+
+def _run_segments(objective_function, num_processes, num_iterations, initial_harmonies, history_store, segment_size, max_run_retries,
+                  mp_context, cancellation, callback, num_elites, keep_memories, compact, run_timeout, kwargs):
+    """
+        Do num_iterations runs in segments of segment_size improvisations (see ``harmony_search``). Return the results of the runs that
+        didn't fail, a dict mapping the index of each failed run to its error, and the utilization of the pool.
+    """
+    max_imp = objective_function.get_max_imp()
+    searches = [_create_search(objective_function, history=_history_writer(history_store, i), cancellation=cancellation, **kwargs)
+                for i in range(num_iterations)]
+    tasks = [(_resume_worker, (searches[i], initial_harmonies, min(segment_size, max_imp)), dict()) for i in range(num_iterations)]
+    runs = list(range(num_iterations))  # the run each task belongs to
+    traces = dict()  # the history and diversity trace of each run whose next segment is out, see _detach_traces()
+
+    def next_segment(k, hs):
+        i = runs[k]
+        _attach_traces(hs, traces.pop(i, None))
+        searches[i] = hs
+        if hs._num_imp < max_imp and not hs._cancelled and not (cancellation is not None and cancellation.cancelled()):
+            traces[i] = _detach_traces(hs)
+            tasks.append((_resume_worker, (hs, initial_harmonies, min(hs._num_imp + segment_size, max_imp)), dict()))
+            runs.append(i)
+        elif callback is not None and hs._started():
+            callback(i, _run_result(hs, num_elites, keep_memories, compact))
+
+    def remaining_time(k):
+        # runs that haven't been timed yet go first, so that every run is timed early on
+        hs = searches[runs[k]]
+        if not hs._started() or not hs._num_imp or not hs._improvisation_time:
+            return float('inf')
+        return (max_imp - hs._num_imp) * hs._improvisation_time / hs._num_imp
+
+    with _handling_signals(cancellation):
+        _, task_errors, utilization = _run_tasks(num_processes, tasks, max_run_retries, callback=next_segment, mp_context=mp_context,
+                                                 cancellation=cancellation, priority=remaining_time, timeout=run_timeout)
+    for i, run_traces in traces.items():
+        _attach_traces(searches[i], run_traces)
+    errors = dict()
+    for k, error in task_errors.items():
+        errors[runs[k]] = error
+    finished = list()
+    for i, hs in enumerate(searches):
+        if i in errors or not hs._started():
+            continue
+        if hs._num_imp < max_imp:
+            hs._cancelled = True
+        finished.append(_run_result(hs, num_elites, keep_memories, compact))
+    return finished, errors, utilization
 
-def harmony_search_serial(objective_function, num_iterations, initial_harmonies=None):
+
+def harmony_search_serial(objective_function, num_iterations, initial_harmonies=None, history_path=None, cancellation=None, callback=None,
+                          num_elites=10, keep_memories=True, keep_histories=True, compact=None, **kwargs):
     """
         Same as ``harmony_search`` but without multiprocessing. This could be useful when there's already multiprocessing in, e.g.,
         ``get_fitness`` method in ``objective_function``, since multiprocessing cannot be used within multiprocessing.
     """
+    if compact is not None:
+        check_precision(compact)
+    if not keep_histories:
+        kwargs['record_history'] = False
+    history_store = _create_history_store(objective_function, history_path)
+    start = datetime.now()
+    results = list()
+    with _handling_signals(cancellation):
+        for i in range(num_iterations):
+            result = worker(objective_function, initial_harmonies, _history_writer(history_store, i), num_elites=num_elites,
+                            keep_memories=keep_memories, compact=compact, cancellation=cancellation, **kwargs)
+            if result is None:
+                break
+            results.append(result)
+            if callback is not None:
+                callback(i, result)
+    end = datetime.now()
+    elapsed_time = end - start
+    return _summarize(objective_function, results, elapsed_time, cancelled_runs=num_iterations - len(results), num_elites=num_elites)
+
+
+def harmony_search_racing(objective_function, num_processes, num_iterations, initial_harmonies=None, history_path=None, min_budget=None,
+                          reduction_factor=2, max_run_retries=2, mp_context=None, cancellation=None, callback=None, num_elites=10,
+                          keep_memories=True, keep_histories=True, compact=None, run_timeout=None, **kwargs):
+    """
+        Same as ``harmony_search``, but runs are raced against each other using successive halving instead of all getting the full
+        max_imp improvisations. All runs first get min_budget improvisations. Then only the best 1/reduction_factor of them (ranked by
+        the best fitness in their harmony memory) are continued, with reduction_factor times the budget, and so on until the survivors
+        reach max_imp. Runs that are stuck far from the best are dropped early, so the same best fitness is usually found with much less
+        total CPU time.
+
+        By default, min_budget is chosen so that a single run survives the last round. Dropped runs are still part of the results: their
+        harmony memories and histories are what they were when they were dropped. A run that fails (see ``harmony_search``) is dropped as
+        well; it's left out of the results only if it failed before completing its first round. If the search is cancelled, no more rounds
+        are started. callback (see ``harmony_search``) is called for each run once the race is over. run_timeout (see ``harmony_search``)
+        applies to each round of a run. With compact (see ``harmony_search``), runs are converted in this process once the race is over.
+    """
+    if compact is not None:
+        check_precision(compact)
+    if not keep_histories:
+        kwargs['record_history'] = False
+    max_imp = objective_function.get_max_imp()
+    if min_budget is None:
+        num_rounds = 0
+        while reduction_factor ** (num_rounds + 1) <= num_iterations:
+            num_rounds += 1
+        min_budget = max(1, max_imp // reduction_factor ** num_rounds)
+    history_store = _create_history_store(objective_function, history_path)
+    searches = [_create_search(objective_function, history=_history_writer(history_store, i), cancellation=cancellation, **kwargs)
+                for i in range(num_iterations)]
+    active = list(range(num_iterations))
+    failed = dict()
+    utilization = None
     start = datetime.now()
-    results = [worker(objective_function, initial_harmonies) for i in range(num_iterations)]
+    budget = min_budget
+    while active:
+        target = max_imp if len(active) == 1 else min(budget, max_imp)
+        traces = dict((i, _detach_traces(searches[i])) for i in active)
+        tasks = [(_resume_worker, (searches[i], initial_harmonies, target), dict()) for i in active]
+        with _handling_signals(cancellation):
+            results, errors, round_utilization = _run_tasks(num_processes, tasks, max_run_retries, mp_context=mp_context,
+                                                            cancellation=cancellation, timeout=run_timeout)
+        utilization = _merge_utilization(utilization, round_utilization)
+        for k, error in errors.items():
+            failed[active[k]] = error
+        survivors = list()
+        for i, result in zip(active, results):
+            if result is not None:
+                searches[i] = result
+                survivors.append(i)
+            _attach_traces(searches[i], traces[i])
+        active = survivors
+        if target >= max_imp or (cancellation is not None and cancellation.cancelled()):
+            break
+        active.sort(key=lambda i: searches[i]._best()[1], reverse=objective_function.maximize())
+        active = active[:max(1, -(-len(active) // reduction_factor))]  # keep the best ceil(len(active) / reduction_factor) runs
+        budget *= reduction_factor
     end = datetime.now()
     elapsed_time = end - start
 
+    finished = [i for i, hs in enumerate(searches) if hs._started()]
+    _raise_if_all_failed(finished, failed)
+    failed_runs = sum(1 for i in failed if not searches[i]._started())
+    results = [_run_result(searches[i], num_elites, keep_memories, compact) for i in finished]
+    if callback is not None:
+        for i, result in zip(finished, results):
+            callback(i, result)
+    return _summarize(objective_function, results, elapsed_time, failed_runs=failed_runs,
+                      cancelled_runs=num_iterations - len(finished) - failed_runs, utilization=utilization, num_elites=num_elites)
+
+
+def harmony_search_batched(objective_function, num_iterations, initial_harmonies=None, history_path=None, cancellation=None, callback=None,
+                           num_elites=10, keep_memories=True, keep_histories=True, compact=None, **kwargs):
+    """
+        Same as ``harmony_search_serial``, but the runs are done in lockstep within a single process instead of one after another. Each
+        step, every run improvises one harmony, and all of these harmonies are evaluated with a single call to get_fitness_batch().
+        The initial harmony memories of all runs are likewise evaluated in one batch. When the objective function is cheap and
+        implements get_fitness_batch() efficiently (e.g., vectorized), this avoids the process startup and pickling overhead of
+        ``harmony_search`` entirely. The results are the same as for num_iterations separate runs.
+
+        Because all runs share the random module, it's seeded once (if a random seed is used), so results are reproducible, but the runs
+        differ from each other.
+
+        If the search is cancelled (see CancellationToken), all runs stop after the current step. callback (see ``harmony_search``) is
+        called for each run once all runs are done. multi_fidelity screening (see HarmonySearch) isn't supported, since harmonies are
+        evaluated in batches here.
+    """
+    if kwargs.get('multi_fidelity'):
+        raise ValueError('multi_fidelity cannot be combined with harmony_search_batched().')
+    if compact is not None:
+        check_precision(compact)
+    if not keep_histories:
+        kwargs['record_history'] = False
+    history_store = _create_history_store(objective_function, history_path)
+    searches = [_create_search(objective_function, history=_history_writer(history_store, i), cancellation=cancellation, **kwargs)
+                for i in range(num_iterations)]
+    start = datetime.now()
+    if not searches:
+        return _summarize(objective_function, list(), datetime.now() - start, num_elites=num_elites)
+
+    # every search gets the same keyword arguments (and thus the same archive, if any), so any of them can evaluate a batch for all
+    evaluator = searches[0]
+    evaluator._seed()
+    initial_candidates = [hs._initial_candidates(initial_harmonies) for hs in searches]
+    fitnesses = iter(evaluator._evaluate_batch([harmony for _, harmonies in initial_candidates for harmony in harmonies],
+                                               owners=[hs for hs, (_, harmonies) in zip(searches, initial_candidates) for _ in harmonies]))
+    for hs, (candidates, harmonies) in zip(searches, initial_candidates):
+        candidates.extend((harmony, next(fitnesses)) for harmony in harmonies)
+        hs._fill_memory(candidates)
+
+    with _handling_signals(cancellation):
+        for _ in range(objective_function.get_max_imp()):
+            if cancellation is not None and cancellation.cancelled():
+                break
+            harmonies = [hs._new_harmony() for hs in searches]
+            for hs, harmony, fitness in zip(searches, harmonies, evaluator._evaluate_batch(harmonies, owners=searches)):
+                hs._accept(harmony, fitness)
+    for hs in searches:
+        if hs._num_imp >= objective_function.get_max_imp():
+            hs._complete()
+        else:
+            hs._cancelled = True
+
+    end = datetime.now()
+    elapsed_time = end - start
+    results = [_run_result(hs, num_elites, keep_memories, compact) for hs in searches]
+    if callback is not None:
+        for i, result in enumerate(results):
+            callback(i, result)
+    return _summarize(objective_function, results, elapsed_time, num_elites=num_elites)
+
+
+def _run_tasks(num_processes, tasks, max_retries, callback=None, mp_context=None, cancellation=None, priority=None, timeout=None):
+    """
+        Run (function, args, kwargs) tasks on a pool of num_processes processes and return a list with the result of each task (None for
+        tasks that failed), a dict mapping the index of each failed task to its last error, and the utilization of the pool. If callback
+        is given, it's called with the index and result of each task as soon as the task finishes. The callback may append follow-up
+        tasks to tasks, which are then run as well.
+
+        Tasks are started in order, unless priority is given. It's then called with the index of each waiting task whenever a process
+        is free, and the task with the highest priority is started.
+
+        utilization is a dictionary with the number of processes, the number of completed tasks, the time spent on them by the worker
+        processes (busy_time, in seconds), the wall clock time the pool was running (wall_time), and the fraction of the available
+        process time that was spent on tasks (utilization). The rest went to idle processes, process startup, and communication.
+
+        Only num_processes tasks are submitted at a time, so every submitted task is (about to be) running. A task that raises an exception
+        is put back in the queue up to max_retries times. If a worker process dies, the pool is broken and every submitted task that hadn't
+        finished yet fails with BrokenProcessPool. Since there's no telling which of them killed the worker, each of them counts this as a
+        failed attempt, and a new pool is started for the remaining tasks. Results of finished tasks are kept.
+
+        If timeout is given, a task that hasn't finished timeout seconds after it was submitted is presumed hung (e.g., in native code that
+        evaluation_timeout can't interrupt). The worker processes are then terminated, and as with a crashed worker, every unfinished
+        task counts a failed attempt (with a RunTimeout error) and is put back in the queue for a new pool.
+
+        mp_context is a start method name or multiprocessing context (see ``harmony_search``). Worker processes ignore SIGINT, so a
+        KeyboardInterrupt is only raised in this process, which then cancels the queued tasks and stops the workers before re-raising it.
+        The same goes for an exception raised by callback; it's never taken for a failure of the task whose result was passed to it.
+
+        If cancellation (a CancellationToken) is given, it's shared with the workers, and once it's cancelled, no more tasks are started;
+        their results are None, but they aren't counted as errors.
+    """
+    if num_processes < 1:
+        raise ValueError('num_processes must be at least 1.')
+    if isinstance(mp_context, str):
+        mp_context = multiprocessing.get_context(mp_context)
+    initargs = () if cancellation is None else (cancellation._share(mp_context),)
+    start = datetime.now()
+    busy_time = 0.0
+    completed = 0
+    results = [None] * len(tasks)
+    errors = dict()
+    attempts = [0] * len(tasks)
+    queue = list(range(len(tasks)))
+    queue.reverse()  # pop() takes tasks from the end, so this runs them in order
+    while queue:
+        executor = ProcessPoolExecutor(num_processes, mp_context=mp_context, initializer=_initialize_worker, initargs=initargs)
+        futures = dict()
+        submitted = dict()  # the time.monotonic() at which each future was submitted
+        broken = False
+        terminated = False
+        try:
+            while futures or (queue and not broken):
+                if cancellation is not None and cancellation.cancelled():
+                    del queue[:]
+                while queue and not broken and len(futures) < num_processes:
+                    if priority is None:
+                        i = queue.pop()
+                    else:
+                        i = max(reversed(queue), key=priority)  # ties go to the earliest task
+                        queue.remove(i)
+                    try:
+                        future = executor.submit(_timed_call, *tasks[i])
+                        futures[future] = i
+                        submitted[future] = time.monotonic()
+                    except BrokenProcessPool:
+                        queue.append(i)
+                        broken = True
+                wait_time = None
+                if timeout is not None and futures:
+                    wait_time = max(0.0, min(submitted[future] for future in futures) + timeout - time.monotonic())
+                done, _ = wait(futures, timeout=wait_time, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = futures.pop(future)
+                    del submitted[future]
+                    try:
+                        result, seconds = future.result()
+                    except BrokenProcessPool as e:
+                        broken = True
+                        attempts[i] += 1
+                        errors[i] = e
+                    except Exception as e:
+                        attempts[i] += 1
+                        errors[i] = e
+                    else:
+                        results[i] = result
+                        busy_time += seconds
+                        completed += 1
+                        errors.pop(i, None)
+                        # outside the try, so that an error in the callback is raised instead of being taken for a failed task
+                        if callback is not None:
+                            callback(i, result)
+                            while len(results) < len(tasks):
+                                queue.insert(0, len(results))
+                                results.append(None)
+                                attempts.append(0)
+                        continue
+                    if attempts[i] <= max_retries:
+                        queue.append(i)
+                if timeout is not None and any(time.monotonic() - submitted[future] >= timeout for future in futures):
+                    # a hung task can't be cancelled, only its process can be stopped, which takes the pool down with it
+                    _terminate(executor)
+                    terminated = True
+                    for future, i in futures.items():
+                        attempts[i] += 1
+                        errors[i] = RunTimeout('Task {} did not finish within {} seconds.'.format(i, timeout))
+                        if attempts[i] <= max_retries:
+                            queue.append(i)
+                    futures.clear()
+                    submitted.clear()
+                    break
+        except BaseException:
+            # KeyboardInterrupt or an error raised by the callback
+            for future in futures:
+                future.cancel()
+            _terminate(executor)
+            raise
+        if not terminated:
+            executor.shutdown(wait=True)
+    wall_time = (datetime.now() - start).total_seconds()
+    utilization = {'processes': num_processes, 'tasks': completed, 'busy_time': busy_time, 'wall_time': wall_time,
+                   'utilization': busy_time / (num_processes * wall_time) if wall_time > 0 else 0.0}
+    return results, errors, utilization
+
+
+def _timed_call(function, args, kwargs):
+    """
+        Run a task in a worker process and return its result and how long it took in seconds.
+    """
+    start = datetime.now()
+    result = function(*args, **kwargs)
+    return result, (datetime.now() - start).total_seconds()
+
+
+def _merge_utilization(utilization, other):
+    """
+        Combine the utilization of two pools that ran one after the other.
+    """
+    if utilization is None:
+        return other
+    merged = {'processes': utilization['processes']}
+    for key in ('tasks', 'busy_time', 'wall_time'):
+        merged[key] = utilization[key] + other[key]
+    merged['utilization'] = merged['busy_time'] / (merged['processes'] * merged['wall_time']) if merged['wall_time'] > 0 else 0.0
+    return merged
+
+
+def _terminate(executor):
+    """
+        Stop the worker processes of an executor without waiting for the runs they're busy with. ProcessPoolExecutor has no public way
+        to do this (shutdown() waits for running tasks), so its processes are terminated directly.
+    """
+    processes = list((getattr(executor, '_processes', None) or dict()).values())
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    executor.shutdown(wait=False)
+    for process in processes:
+        process.join()
+
+
+def _raise_if_all_failed(results, errors):
+    """
+        Partial results are returned when some runs fail, but if no run succeeded, raise the first error instead.
+    """
+    if errors and not any(result is not None for result in results):
+        raise errors[min(errors)]
+
+
+def _run_result(hs, num_elites=10, keep_memories=True, compact=None):
+    """
+        Return the result of a finished run: the tuple returned by HarmonySearch.run() followed by the run's statistics. The run's best
+        num_elites distinct harmonies are added to the statistics as 'elites'. If keep_memories is False, the harmony memory is left out
+        (replaced by None), so that it doesn't have to be sent back from a worker process. So is the history if the run didn't record
+        one (see keep_histories in ``harmony_search``). If compact is 'double' or 'single', the
+        memory and history (unless it's on disk) are converted to compact objects of that precision.
+    """
+    best_harmony, best_fitness, harmony_memory, harmony_history = hs._finish()
+    statistics = hs._statistics()
+    pool = ElitePool(num_elites, hs._obj_fun.maximize())
+    pool.merge(harmony_memory)
+    statistics['elites'] = pool.elites()
+    if not hs._record_history:
+        harmony_history = None
+    if not keep_memories:
+        harmony_memory = None
+    elif compact is not None:
+        harmony_memory = CompactMemory(harmony_memory, compact)
+    if compact is not None and isinstance(harmony_history, list):
+        harmony_history = CompactHistory(harmony_history, compact)
+    return best_harmony, best_fitness, harmony_memory, harmony_history, statistics
+
+
+def _summarize(objective_function, results, elapsed_time, failed_runs=0, cancelled_runs=0, utilization=None, num_elites=10):
+    """
+        Build HarmonySearchResults from the (best_harmony, best_fitness, harmony_memory, harmony_history, statistics) tuples returned by
+        each run. cancelled_runs is the number of runs that were never started because the search was cancelled; runs that were cut short
+        are counted from their statistics. The elites of the runs are merged into the global best num_elites.
+    """
     # find best harmony from all iterations
     best_harmony = None
     best_fitness = float('-inf') if objective_function.maximize() else float('+inf')
     harmony_memories = list()
     harmony_histories = list()
+    failed_evaluations = 0
+    evaluations = 0
+    low_fidelity_evaluations = 0
+    diversity_traces = list()
+    elite_pool = ElitePool(num_elites, objective_function.maximize())
     for result in results:
-        harmony, fitness, harmony_memory, harmony_history = result
+        harmony, fitness, harmony_memory, harmony_history, statistics = result
         if (objective_function.maximize() and fitness > best_fitness) or (not objective_function.maximize() and fitness < best_fitness):
             best_harmony = harmony
             best_fitness = fitness
         harmony_memories.append(harmony_memory)
         harmony_histories.append(harmony_history)
+        failed_evaluations += statistics['failed_evaluations']
+        evaluations += statistics['evaluations']
+        low_fidelity_evaluations += statistics['low_fidelity_evaluations']
+        diversity_traces.append(statistics['diversity_trace'])
+        elite_pool.merge(statistics['elites'])
+        if statistics['cancelled']:
+            cancelled_runs += 1
 
     return HarmonySearchResults(elapsed_time=elapsed_time, best_harmony=best_harmony, best_fitness=best_fitness,\
-                                harmony_memories=harmony_memories, harmony_histories=harmony_histories)
+                                harmony_memories=harmony_memories, harmony_histories=harmony_histories,\
+                                failed_runs=failed_runs, failed_evaluations=failed_evaluations, evaluations=evaluations,\
+                                diversity_traces=diversity_traces, cancelled_runs=cancelled_runs, utilization=utilization,\
+                                low_fidelity_evaluations=low_fidelity_evaluations, elites=elite_pool.elites())
+
+
+def _create_history_store(objective_function, history_path):
+    """
+        Create the HarmonyHistoryStore used by a search, or return None if histories are kept in RAM.
+    """
+    if history_path is None:
+        return None
+    return HarmonyHistoryStore(history_path, objective_function.get_hms(), objective_function.get_num_parameters())
+
+
+def _history_writer(history_store, run):
+    return None if history_store is None else history_store.writer(run)
+
+
+def worker(objective_function, initial_harmonies=None, history=None, num_elites=10, keep_memories=True, compact=None, **kwargs):
+    """
+        This is just a dummy function to make multiprocessing work with a class. It returns None without doing anything if the search has
+        been cancelled. num_elites, keep_memories, and compact are passed on to _run_result().
+    """
+    cancellation = kwargs.get('cancellation')
+    if cancellation is not None and cancellation.cancelled():
+        return None
+    hs = _create_search(objective_function, history=history, **kwargs)
+    hs.run(initial_harmonies=initial_harmonies)
+    return _run_result(hs, num_elites, keep_memories, compact)
 
 
-def worker(objective_function, initial_harmonies=None):
+def _create_search(objective_function, engine=None, **kwargs):
     """
-        This is just a dummy function to make multiprocessing work with a class. It also checks/sets the global multiprocessing.Event to prevent
-        new processes from starting work on a KeyboardInterrupt.
+        Create the HarmonySearch for one run. engine is the class to use instead of HarmonySearch, e.g., DiscreteHarmonySearch.
     """
+    return (engine or HarmonySearch)(objective_function, **kwargs)
+
+
+def _resume_worker(hs, initial_harmonies, num_imp):
+    """
+        Used by harmony_search_racing and segmented harmony_search to continue a run until it has made num_imp improvisations. The run is
+        started first if necessary, and the (picklable) HarmonySearch is sent back so that it can be continued later, possibly in a
+        different process.
+    """
+    if hs._cancellation is not None and hs._cancellation.cancelled():
+        return hs
+    if not hs._started():
+        hs._start(initial_harmonies)
+    hs._improvise(num_imp - hs._num_imp)
+    return hs
+
+
+def _detach_traces(hs):
+    """
+        Take the history and diversity trace that hs has recorded so far off it and return them, so that they aren't pickled along with
+        it each time it's sent to a worker by _resume_worker. The worker then only sends back the generations it adds, and
+        _attach_traces() puts the two together again.
+    """
+    harmony_history = getattr(hs, '_harmony_history', None)
+    diversity_trace = getattr(hs, '_diversity_trace', None)
+    if isinstance(harmony_history, list):
+        hs._harmony_history = list()
+    if diversity_trace is not None:
+        hs._diversity_trace = list()
+    return harmony_history, diversity_trace
+
+
+def _attach_traces(hs, traces):
+    """
+        Put the history and diversity trace taken off a run by _detach_traces() back in front of the ones hs has recorded since.
+    """
+    if traces is None:
+        return
+    harmony_history, diversity_trace = traces
+    if isinstance(harmony_history, list):
+        harmony_history.extend(hs._harmony_history)
+        hs._harmony_history = harmony_history
+    if diversity_trace is not None:
+        diversity_trace.extend(hs._diversity_trace)
+        hs._diversity_trace = diversity_trace
+
+
+def _overrides_fitness_delta(objective_function):
+    """
+        Return True if the objective function implements get_fitness_delta() itself rather than inheriting the default.
+    """
+    method = getattr(objective_function, 'get_fitness_delta', None)
+    return method is not None and getattr(method, '__func__', None) is not ObjectiveFunctionInterface.get_fitness_delta
+
+
+def _handling_signals(cancellation):
+    return nullcontext() if cancellation is None else cancellation._handling_signals()
+
+
+def _raise_timeout(signum, frame):
+    raise EvaluationTimeout()
+
+
+def _call_with_timeout(function, argument, timeout):
+    """
+        Call function(argument), raising EvaluationTimeout if it takes longer than timeout seconds (if timeout isn't None).
+    """
+    if timeout is None:
+        return function(argument)
+    previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
     try:
-        if not terminating.is_set():
-            hs = HarmonySearch(objective_function)
-            return hs.run(initial_harmonies=initial_harmonies)
-    except KeyboardInterrupt:
-        terminating.set()  # set the Event to true to prevent the other processes from doing any work
-        raise
+        return function(argument)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
 
 
 class HarmonySearch(object):
@@ -125,61 +774,464 @@ class HarmonySearch(object):
         3. Run HarmonySearch (e.g., results = hs.run()).
     """
 
-    def __init__(self, objective_function):
+    def __init__(self, objective_function, history=None, initializer='random', opposition=False, archive=None, cache=True, warm_start=None,
+                 rescore=False, evaluation_timeout=None, max_retries=0, failure_fitness=None, noise_handling=False, max_reevaluations=4,
+                 confidence=2.0, track_diversity=False, diversity_threshold=None, refresh_fraction=0.2, local_search=False,
+                 local_search_interval=None, local_search_budget=100, local_search_elites=1, local_search_step=0.05, cancellation=None,
+                 max_delta_fraction=0.5, multi_fidelity=False, promotion_margin=0.0, memory_selection='uniform', tournament_size=2,
+                 record_history=True):
         """
             Initialize HS with the specified objective function. Note that this objective function must implement ObjectiveFunctionInterface.
+
+            history is an optional HistoryWriter (see HarmonyHistoryStore.writer()). If given, each generation is streamed to disk instead of
+            being kept in RAM, and run() returns a lazy RunHistory in place of the usual list. Set record_history to False to not keep a
+            history at all; harmony_history is then always empty.
+
+            initializer determines how the harmony memory is filled when no initial harmonies are given. It's either the name of one of the
+            built-in initializers ('random', 'latin_hypercube', 'halton', or 'sobol'; see initialization.py) or a callable with the same
+            signature. If opposition is True, opposition-based initialization is used on top of it: hms candidates and their opposites are
+            evaluated, and the best hms of them are kept.
+
+            archive is an optional HarmonyArchive that records every harmony evaluated by this search. If cache is True, the archive is also
+            used as an evaluation cache: harmonies already in it aren't evaluated again. warm_start seeds the harmony memory from the archive
+            instead of starting cold; it's either 'top' (the best hms harmonies) or 'diverse' (see HarmonyArchive.diverse()). If the archive
+            holds fewer than hms suitable harmonies, the rest are generated by the initializer. Set rescore to True if the objective function
+            has changed since the archived harmonies were evaluated; they'll then be evaluated again (in one batch) instead of trusting the
+            archived fitness.
+
+            The remaining arguments make evaluation fault tolerant. If evaluation_timeout (in seconds) is given, a get_fitness() call that
+            takes longer is interrupted with EvaluationTimeout. This relies on SIGALRM, so it's only available on Unix, in the main thread,
+            and it can't interrupt native code that never returns control to Python. A call that raises an exception or times out is retried
+            up to max_retries times. If it still fails, the harmony is given failure_fitness (e.g., float('-inf') when maximizing, so it never
+            enters the harmony memory) and counted as a failed evaluation; if failure_fitness is None, the error is raised instead.
+
+            Set noise_handling to True if get_fitness() is noisy (e.g., a stochastic simulation). The fitness of each harmony in memory is
+            then the mean of all samples taken of it, and when it's unclear whether a new harmony is better than the worst one in memory, the
+            less certain of the two is re-evaluated, up to max_reevaluations times per decision. A difference counts as clear once it exceeds
+            confidence standard errors. Noise can't be combined with an archive cache, since that would keep returning the same sample.
+
+            If track_diversity is True, the diversity of harmony_memory is recorded once per generation (see _diversity()). If
+            diversity_threshold is given, diversity is tracked as well, and whenever it drops below the threshold, the worst refresh_fraction
+            of harmony_memory is replaced by new harmonies from get_value(). After a refresh, the memory gets at least one generation to
+            recover before it's refreshed again.
+
+            Set local_search to True to polish the best harmonies with a derivative-free pattern search (see local_search.py) at the end of
+            the run, and also every local_search_interval improvisations if that's given. Each time, the best local_search_elites harmonies
+            are refined with up to local_search_budget evaluations each, starting with steps of local_search_step times each parameter's range.
+            Bounds are respected and discrete parameters stay on their value grid. Improved harmonies replace the ones they started from.
+
+            cancellation is an optional CancellationToken that's checked before every improvisation. Once it's cancelled, the run stops
+            (skipping the final local search) and returns the results it has so far.
+
+            If the objective function overrides get_fitness_delta(), each new harmony is compared to the harmony in memory that most of its
+            notes were taken from. If at most max_delta_fraction of its parameters differ, get_fitness_delta() is called with just those
+            changes instead of get_fitness(). This isn't done with noise_handling, since the fitness in memory is then an average.
+
+            Set multi_fidelity to True if the objective function can also be evaluated cheaply but less accurately, i.e., if its
+            get_fitness() accepts fidelity='low' (see ObjectiveFunctionInterface). Each new harmony is then screened at low fidelity first,
+            and only promoted to a regular (high-fidelity) evaluation if its low-fidelity fitness is better than that of the worst harmony in
+            memory, or worse by at most promotion_margin. Harmonies that aren't promoted are discarded. harmony_memory is still ordered by
+            high-fidelity fitness; the low-fidelity fitness of the harmonies in memory is evaluated as needed for screening. Screening is
+            part of run() and resume(), so it can't be combined with ask()/tell() or harmony_search_batched(), which evaluate harmonies
+            themselves, or with harmony_search_cooperative(), whose group objectives have no low-fidelity evaluation.
+
+            memory_selection determines which harmony in memory each note is taken from during memory consideration: 'uniform' (the
+            original HS), or one that favors better harmonies: 'rank', 'proportional' (to fitness), or 'tournament' (the best of
+            tournament_size harmonies drawn uniformly). See selection.py.
         """
+        if evaluation_timeout is not None and not hasattr(signal, 'setitimer'):
+            raise ValueError('evaluation_timeout is not supported on this platform.')
+        if noise_handling and archive is not None and cache:
+            raise ValueError('noise_handling cannot be combined with an archive cache; pass cache=False.')
+        if warm_start not in (None, 'top', 'diverse'):
+            raise ValueError("warm_start must be None, 'top', or 'diverse'.")
+        if warm_start is not None and archive is None:
+            raise ValueError('warm_start requires an archive.')
+        self._selection_factory = get_selection(memory_selection, tournament_size)
+        self._selection = None
         self._obj_fun = objective_function
+        self._history = history
+        self._record_history = record_history
+        self._initializer = get_initializer(initializer)
+        self._opposition = opposition
+        self._archive = archive
+        self._cache = cache
+        self._warm_start = warm_start
+        self._rescore = rescore
+        self._evaluation_timeout = evaluation_timeout
+        self._max_retries = max_retries
+        self._failure_fitness = failure_fitness
+        self._num_failed_evaluations = 0
+        self._num_evaluations = 0
+        self._noise_handling = noise_handling
+        self._max_reevaluations = max_reevaluations
+        self._confidence = confidence
+        self._num_reevaluations = 0
+        self._track_diversity = track_diversity or diversity_threshold is not None
+        self._diversity_threshold = diversity_threshold
+        self._refresh_fraction = refresh_fraction
+        self._num_refreshes = 0
+        self._local_search = local_search
+        self._local_search_interval = local_search_interval
+        self._local_search_budget = local_search_budget
+        self._local_search_elites = local_search_elites
+        self._local_search_step = local_search_step
+        self._cancellation = cancellation
+        self._cancelled = False
+        self._improvisation_time = 0.0
+        self._max_delta_fraction = max_delta_fraction
+        self._multi_fidelity = multi_fidelity
+        self._promotion_margin = promotion_margin
+        self._num_low_fidelity_evaluations = 0
+        self._num_promotions = 0
+        self._low_fidelity_memory = None
+        self._screened = None
+        self._num_delta_evaluations = 0
+        self._num_objective_changes = 0
+        self._sources = None
+        self._initial_queue = None
+        self._told_candidates = list()
+        self._harmony_memory = None
+        self._random_state = None
 
     def run(self, initial_harmonies=None):
         """
             This is the main HS loop. It initializes the harmony memory and then continually generates new harmonies
             until the stopping criterion (max_imp iterations) is reached.
         """
+        self._start(initial_harmonies)
+        self._improvise(self._obj_fun.get_max_imp())
+        return self._finish()
+
+    def ask(self, n=1):
+        """
+            Return n new harmonies to be evaluated. Together with tell(), this is an alternative to run() for when the caller wants to
+            evaluate harmonies itself (e.g., on its own workers or batch scheduler) instead of having HarmonySearch call get_fitness():
+
+            >>> hs = HarmonySearch(obj_fun)
+            >>> while not hs.done():
+            ...     harmonies = hs.ask(10)
+            ...     hs.tell(harmonies, [evaluate_elsewhere(harmony) for harmony in harmonies])
+            >>> best_harmony, best_fitness, harmony_memory, harmony_history = hs.result()
+
+            ask() and tell() can be interleaved freely: several batches can be out for evaluation at once, and results can be told in any
+            order. Until the harmony memory has been filled, ask() hands out the harmonies of the initializer, followed by random harmonies
+            if more are asked for; the memory is filled with the best hms of them once the initializer's harmonies have all been told. After
+            that, every harmony is improvised from the current harmony memory, and each one told counts as an improvisation.
+
+            Each search keeps its own random state between calls, and the caller's state of the random module is put back before
+            ask() and tell() return, so the caller's own random numbers (e.g., the noise of a stochastic simulation) are unaffected.
+
+            A HarmonySearch can be pickled between calls, so one controller can drive many searches. Note that the features that need
+            extra evaluations (noise_handling re-evaluations, local_search, warm starts with rescore) still call the objective function.
+        """
+        if self._multi_fidelity:
+            raise ValueError('multi_fidelity cannot be combined with ask()/tell().')
+        caller_state = self._restore_random_state()
+        try:
+            if self._harmony_memory is None:
+                if self._initial_queue is None:
+                    candidates, harmonies = self._initial_candidates()
+                    self._told_candidates.extend(candidates)
+                    self._initial_queue = harmonies
+                    self._num_initial = len(candidates) + len(harmonies)
+                harmonies = self._initial_queue[:n]
+                del self._initial_queue[:n]
+                harmonies.extend(random_harmonies(self._obj_fun, n - len(harmonies)))
+            else:
+                harmonies = [self._new_harmony() for _ in range(n)]
+            self._random_state = random.getstate()
+        finally:
+            random.setstate(caller_state)
+        return harmonies
+
+    def tell(self, harmonies, fitnesses):
+        """
+            Report the fitness of harmonies handed out by ask() (or any other harmonies; e.g., telling hms harmonies before the first ask()
+            fills the harmony memory with them). See ask().
+        """
+        if len(harmonies) != len(fitnesses):
+            raise ValueError('The number of harmonies and fitnesses must be the same.')
+        if self._multi_fidelity:
+            raise ValueError('multi_fidelity cannot be combined with ask()/tell().')
+        caller_state = self._restore_random_state()
+        try:
+            for harmony, fitness in zip(harmonies, fitnesses):
+                harmony = list(harmony)
+                self._num_evaluations += 1
+                if self._archive is not None:
+                    self._archive.record(harmony, fitness)
+                if self._harmony_memory is None:
+                    self._told_candidates.append((harmony, fitness))
+                    if len(self._told_candidates) >= max(self._num_initial if self._initial_queue is not None else 0,
+                                                         self._obj_fun.get_hms()):
+                        self._fill_memory(self._told_candidates)
+                        self._told_candidates = list()
+                else:
+                    self._accept(harmony, fitness)
+                    if self._num_imp == self._obj_fun.get_max_imp():
+                        self._complete()
+            self._random_state = random.getstate()
+        finally:
+            random.setstate(caller_state)
+
+    def done(self):
+        """
+            Return True once max_imp improvisations have been told (see ask()).
+        """
+        return self._harmony_memory is not None and self._num_imp >= self._obj_fun.get_max_imp()
+
+    def result(self):
+        """
+            Return the best harmony, its fitness, the harmony memory, and the harmony history so far, as returned by run().
+        """
+        if self._harmony_memory is None:
+            raise ValueError('The harmony memory has not been filled yet.')
+        return self._finish()
+
+    def resume(self, num_improvisations=None):
+        """
+            Continue a run that was started with run() or ask()/tell() (possibly after pickling it) for num_improvisations more
+            improvisations, or until max_imp is reached if that's None. Return the same as run().
+        """
+        if self._harmony_memory is None:
+            raise ValueError('The harmony memory has not been filled yet.')
+        caller_state = random.getstate()
+        try:
+            self._improvise(self._obj_fun.get_max_imp() if num_improvisations is None else num_improvisations)
+        finally:
+            random.setstate(caller_state)
+        return self._finish()
+
+    def objective_changed(self, objective_function=None, fresh_fraction=0.2):
+        """
+            Tell a started (or finished, or unpickled) run that the objective function has changed, e.g., because the data it depends on
+            was refreshed, so that it can track the moving optimum instead of starting over. If objective_function is given, it replaces
+            the current one; it must have the same number of parameters.
+
+            Every harmony in memory is re-evaluated, and then the worst fresh_fraction of the memory is replaced by new harmonies from the
+            initializer to bring back the diversity a converged memory has lost. All of these evaluations are done with a single call to
+            get_fitness_batch(). The improvisation count starts over, so resume() (or ask()/tell()) can then do another max_imp
+            improvisations. The history carries on, starting with a snapshot of the re-evaluated memory.
+
+            An archive can't be used as a cache here, since its fitness values would be out of date; pass cache=False.
+        """
+        if self._harmony_memory is None:
+            raise ValueError('The harmony memory has not been filled yet.')
+        if self._archive is not None and self._cache:
+            raise ValueError('objective_changed() cannot be used with an archive cache; pass cache=False.')
+        if not 0 <= fresh_fraction <= 1:
+            raise ValueError('fresh_fraction must be between 0 and 1.')
+        if objective_function is not None:
+            if objective_function.get_num_parameters() != self._obj_fun.get_num_parameters():
+                raise ValueError('The new objective function must have the same number of parameters.')
+            self._obj_fun = objective_function
+        caller_state = self._restore_random_state()
+        try:
+            self._load_settings()
+
+            hms = len(self._harmony_memory)
+            num_fresh = int(round(fresh_fraction * hms))
+            fresh_harmonies = self._initializer(self._obj_fun, num_fresh) if num_fresh else list()
+            harmonies = [harmony for harmony, _ in self._harmony_memory] + fresh_harmonies
+            fitnesses = self._evaluate_batch(harmonies, use_cache=False)
+            memory = list(zip(harmonies[:hms], fitnesses[:hms]))
+            # the fresh harmonies replace the worst ones, whether or not they're better
+            order = sorted(range(hms), key=lambda i: memory[i][1], reverse=not self._obj_fun.maximize())
+            for i, harmony, fitness in zip(order, fresh_harmonies, fitnesses[hms:]):
+                memory[i] = (harmony, fitness)
+            self._harmony_memory = memory
+
+            # everything derived from the old fitness values or the old memory starts over
+            if self._noise_handling:
+                self._memory_stats = [[1, fitness, 0.0] for _, fitness in memory]
+            if self._multi_fidelity:
+                self._low_fidelity_memory = [None] * hms
+            self._reset_selection()
+            if self._track_diversity:
+                self._reset_diversity()
+            self._num_imp = 0
+            self._last_refresh = 0
+            self._completed = False
+            self._num_objective_changes += 1
+            self._generation += 1
+            self._record_generation(self._generation)
+            self._random_state = random.getstate()
+        finally:
+            random.setstate(caller_state)
+
+    def _reset_selection(self):
+        """
+            Create the memory selector (see selection.py) for the current harmony_memory, or None for uniform selection.
+        """
+        if self._selection_factory is None:
+            self._selection = None
+        else:
+            self._selection = self._selection_factory([fitness for _, fitness in self._harmony_memory], self._obj_fun.maximize())
+
+    def _started(self):
+        return self._harmony_memory is not None
+
+    def _start(self, initial_harmonies=None):
+        """
+            Start a run: seed the random number generator and initialize the harmony memory.
+        """
+        self._seed()
+
+        # fill harmony_memory using random parameter values by default, but with initial_harmonies if provided
+        self._initialize(initial_harmonies)
+
+    def _seed(self):
         # set optional random seed
         if self._obj_fun.use_random_seed():
             random.seed(self._obj_fun.get_random_seed())
 
-        # harmony_memory stores the best hms harmonies
-        self._harmony_memory = list()
+    def _improvise(self, num_improvisations):
+        """
+            Create up to num_improvisations more improvisations, stopping early if max_imp is reached. The state of the random module is
+            saved afterwards and restored here, so that a run can be continued later, possibly after being pickled and sent to another
+            process, exactly as if it hadn't been interrupted.
+        """
+        self._restore_random_state()
+        self._load_settings()
+        start = datetime.now()
+        stop = min(self._num_imp + num_improvisations, self._obj_fun.get_max_imp())
+        cancellation = self._cancellation
+        while(self._num_imp < stop):
+            if cancellation is not None and cancellation.cancelled():
+                self._cancelled = True
+                break
+            harmony = self._new_harmony()
+            self._accept(harmony, self._screen(harmony) if self._multi_fidelity else self._evaluate_improvisation(harmony))
+        if self._num_imp >= self._obj_fun.get_max_imp():
+            self._complete()
+        self._random_state = random.getstate()
+        self._improvisation_time += (datetime.now() - start).total_seconds()
 
-        # harmony_history stores all hms harmonies every nth improvisations (i.e., one 'generation')
-        self._harmony_history = list()
+    def _restore_random_state(self):
+        """
+            Put back the state of the random module saved at the end of the last call, or seed it if this is the first call, and return
+            the state it had before, so that the public methods can give the caller its own random numbers back.
+        """
+        caller_state = random.getstate()
+        if self._random_state is not None:
+            random.setstate(self._random_state)
+        elif self._harmony_memory is None:
+            if self._obj_fun.use_random_seed():
+                self._seed()
+            else:
+                # without a seed, continuing the caller's stream would hand it the same numbers again once its state is put back
+                random.seed()
+        return caller_state
 
-        # fill harmony_memory using random parameter values by default, but with initial_harmonies if provided
-        self._initialize(initial_harmonies)
+    def _complete(self):
+        """
+            Called once the run has made max_imp improvisations to do the final local search, if any.
+        """
+        if self._local_search and not self._completed:
+            self._refine()
+        self._completed = True
 
-        # create max_imp improvisations
-        generation = 0
-        num_imp = 0
-        while(num_imp < self._obj_fun.get_max_imp()):
-            # generate new harmony
-            harmony = list()
-            for i in range(0, self._obj_fun.get_num_parameters()):
-                if random.random() < self._obj_fun.get_hmcr():
-                    self._memory_consideration(harmony, i)
-                    if random.random() < self._obj_fun.get_par():
-                        self._pitch_adjustment(harmony, i)
-                else:
-                    self._random_selection(harmony, i)
-            fitness = self._obj_fun.get_fitness(harmony)
+    def _refine(self):
+        """
+            Refine the best local_search_elites harmonies in harmony_memory with a pattern search.
+        """
+        order = sorted(range(len(self._harmony_memory)), key=lambda i: self._harmony_memory[i][1], reverse=self._obj_fun.maximize())
+        for i in order[:self._local_search_elites]:
+            harmony, fitness = self._harmony_memory[i]
+            refined_harmony, refined_fitness, _ = pattern_search(self._obj_fun, harmony, fitness, self._evaluate, self._local_search_budget,
+                                                                 initial_step=self._local_search_step)
+            if refined_harmony != harmony and all(refined_harmony != other for other, _ in self._harmony_memory):
+                self._replace(i, refined_harmony, refined_fitness)
+
+    def _new_harmony(self):
+        """
+            Improvise a new harmony using memory consideration, pitch adjustment, and random selection.
+        """
+        # this is the hot loop, so the settings cached by _load_settings() and a local reference to random.random are used
+        rand = random.random
+        hmcr = self._hmcr
+        par = self._par
+        # for delta evaluation, sources keeps track of the memory index each note was taken from (-1 for random selection)
+        sources = self._sources = [-1] * self._num_parameters if self._track_sources else None
+        harmony = list()
+        for i in range(0, self._num_parameters):
+            if rand() < hmcr:
+                memory_index = self._memory_consideration(harmony, i)
+                if sources is not None:
+                    sources[i] = memory_index
+                if rand() < par:
+                    self._pitch_adjustment(harmony, i)
+            else:
+                self._random_selection(harmony, i)
+        return harmony
+
+    def _load_settings(self):
+        """
+            Cache the HS settings and the properties of each parameter that are needed while improvising, so that the objective function
+            doesn't have to be asked for them for every note. This is called whenever a run starts or continues.
+        """
+        self._num_parameters = self._obj_fun.get_num_parameters()
+        self._hmcr = self._obj_fun.get_hmcr()
+        self._par = self._obj_fun.get_par()
+        self._mpap = self._obj_fun.get_mpap()
+        self._mpai = self._obj_fun.get_mpai()
+        self._track_sources = not self._noise_handling and self._max_delta_fraction > 0 and _overrides_fitness_delta(self._obj_fun)
+        # for each parameter: None if it isn't variable, (True, number of values) if it's discrete, or (False, lower bound, upper bound)
+        self._pitch_ranges = list()
+        for i in range(self._num_parameters):
+            if not self._obj_fun.is_variable(i):
+                self._pitch_ranges.append(None)
+            elif self._obj_fun.is_discrete(i):
+                self._pitch_ranges.append((True, self._obj_fun.get_num_discrete_values(i)))
+            else:
+                self._pitch_ranges.append((False, self._obj_fun.get_lower_bound(i), self._obj_fun.get_upper_bound(i)))
+
+    def _accept(self, harmony, fitness):
+        """
+            Account for one evaluated improvisation: update harmony_memory and, once per generation, harmony_history. fitness is None for
+            harmonies that were screened out (see _screen()).
+        """
+        if fitness is not None:
             self._update_harmony_memory(harmony, fitness)
-            num_imp += 1
+        self._num_imp += 1
+
+        if self._local_search and self._local_search_interval and self._num_imp % self._local_search_interval == 0:
+            self._refine()
+
+        if self._diversity_threshold is not None and self._num_imp - self._last_refresh >= self._obj_fun.get_hms() and \
+                self._diversity() < self._diversity_threshold:
+            self._refresh_memory()
 
-            # save harmonies every nth improvisations (i.e., one 'generation')
-            if num_imp % self._obj_fun.get_hms() == 0:
-                generation += 1
-                harmony_list = {'gen': generation, 'harmonies': copy.deepcopy(self._harmony_memory)}
-                self._harmony_history.append(harmony_list)
+        # save harmonies every nth improvisations (i.e., one 'generation')
+        if self._num_imp % self._obj_fun.get_hms() == 0:
+            self._generation += 1
+            self._record_generation(self._generation)
+
+    def _finish(self):
+        """
+            Return the best harmony, its fitness, the harmony memory, and the harmony history of the run so far.
+        """
+        if self._history is not None:
+            self._harmony_history = self._history.view()
+        if self._archive is not None:
+            self._archive.flush()
 
         # return best harmony
+        best_harmony, best_fitness = self._best()
+        return best_harmony, best_fitness, self._harmony_memory, self._harmony_history
+
+    def _best(self):
+        """
+            Return the best harmony in harmony_memory and its fitness.
+        """
         best_harmony = None
         best_fitness = float('-inf') if self._obj_fun.maximize() else float('+inf')
         for harmony, fitness in self._harmony_memory:
             if (self._obj_fun.maximize() and fitness > best_fitness) or (not self._obj_fun.maximize() and fitness < best_fitness):
                 best_harmony = harmony
                 best_fitness = fitness
-        return best_harmony, best_fitness, self._harmony_memory, self._harmony_history
+        return best_harmony, best_fitness
 
     def _initialize(self, initial_harmonies=None):
         """
@@ -187,10 +1239,20 @@ class HarmonySearch(object):
             that we aren't actually doing any matrix operations, so a library like NumPy isn't necessary here. The matrix
             merely stores previous harmonies.
 
-            If harmonies are provided, then use them instead of randomly initializing them.
+            If harmonies are provided, then use them instead of generating them with the initializer (or seeding them from the archive).
+            All new initial harmonies are evaluated with a single call to get_fitness_batch().
 
             Populate harmony_history with initial harmony memory.
         """
+        candidates, harmonies = self._initial_candidates(initial_harmonies)
+        candidates.extend(zip(harmonies, self._evaluate_batch(harmonies)))
+        self._fill_memory(candidates)
+
+    def _initial_candidates(self, initial_harmonies=None):
+        """
+            Return the candidates for the initial harmony memory as a list of (harmony, fitness) tuples that are already evaluated (e.g.,
+            seeded from the archive) and a list of harmonies that still need to be evaluated.
+        """
         if initial_harmonies is not None:
             # verify that the initial harmonies are provided correctly
 
@@ -202,20 +1264,306 @@ class HarmonySearch(object):
                 num_parameters_initial_harmonies = len(initial_harmonies[i])
                 if num_parameters_initial_harmonies != num_parameters:
                     raise ValueError('Number of parameters in initial harmonies does not match that defined.')
+            return list(), list(initial_harmonies)
+        candidates = self._warm_start_candidates()
+        initial_harmonies = self._initializer(self._obj_fun, self._obj_fun.get_hms() - len(candidates))
+        if self._opposition:
+            initial_harmonies = initial_harmonies + [opposite_harmony(self._obj_fun, harmony) for harmony in initial_harmonies]
+        return candidates, initial_harmonies
+
+    def _fill_memory(self, candidates):
+        """
+            Fill harmony_memory with the best hms of the evaluated initial candidates and reset the run's counters.
+        """
+        if len(candidates) > self._obj_fun.get_hms():
+            # opposition-based initialization: keep the best hms of the candidates and their opposites
+            candidates.sort(key=lambda candidate: candidate[1], reverse=self._obj_fun.maximize())
+            candidates = candidates[:self._obj_fun.get_hms()]
+
+        # harmony_memory stores the best hms harmonies
+        self._harmony_memory = list(candidates)
+        self._load_settings()
+        if self._noise_handling:
+            # number of samples, mean, and sum of squared deviations of the fitness of each harmony in memory
+            self._memory_stats = [[1, fitness, 0.0] for _, fitness in candidates]
+            self._noise_m2 = 0.0
+            self._noise_df = 0
+        # low-fidelity fitness of each harmony in memory, or None if it hasn't been evaluated (see _screen())
+        self._low_fidelity_memory = [None] * len(self._harmony_memory) if self._multi_fidelity else None
+        self._reset_selection()
+
+        # harmony_history stores all hms harmonies every nth improvisations (i.e., one 'generation')
+        self._harmony_history = list()
+
+        self._diversity_trace = list()
+        if self._track_diversity:
+            self._reset_diversity()
+
+        self._generation = 0
+        self._num_imp = 0
+        self._last_refresh = 0
+        self._completed = False
+        self._record_generation(0)
+
+    def _warm_start_candidates(self):
+        """
+            Return the (harmony, fitness) tuples from the archive used to seed harmony_memory, re-evaluated if rescore is set.
+        """
+        if self._warm_start is None:
+            return list()
+        if self._warm_start == 'top':
+            seeds = self._archive.top(self._obj_fun.get_hms(), self._obj_fun.maximize())
+        else:
+            seeds = self._archive.diverse(self._obj_fun.get_hms(), self._obj_fun.maximize())
+        seeds = [(harmony, fitness) for harmony, fitness in seeds if len(harmony) == self._obj_fun.get_num_parameters()]
+        if self._rescore:
+            harmonies = [harmony for harmony, _ in seeds]
+            seeds = list(zip(harmonies, self._evaluate_batch(harmonies, use_cache=False)))
+        return seeds
+
+    def _evaluate_improvisation(self, harmony):
+        """
+            Return the fitness of a harmony just made by _new_harmony(), using get_fitness_delta() if possible (see __init__()). The base
+            harmony is the one in harmony_memory that the most notes were taken from.
+        """
+        if self._sources is None:
+            return self._evaluate(harmony)
+        counts = Counter(self._sources)
+        counts.pop(-1, None)
+        if not counts:
+            return self._evaluate(harmony)
+        base_harmony, base_fitness = self._harmony_memory[max(counts, key=counts.get)]
+        changed_indices = [i for i, (value, base_value) in enumerate(zip(harmony, base_harmony)) if value != base_value]
+        if len(changed_indices) > self._max_delta_fraction * self._num_parameters or \
+                (self._failure_fitness is not None and base_fitness == self._failure_fitness):
+            return self._evaluate(harmony)
+        return self._evaluate(harmony, delta=(base_harmony, base_fitness, changed_indices, [harmony[i] for i in changed_indices]))
+
+    def _evaluate(self, harmony, delta=None):
+        """
+            Return the fitness of the given harmony, using and updating the archive if there is one. If delta is given, it holds the
+            arguments for get_fitness_delta(), which is then called instead of get_fitness().
+        """
+        if self._archive is not None and self._cache:
+            fitness = self._archive.lookup(harmony)
+            if fitness is not None:
+                return fitness
+        fitness, succeeded = self._call_objective(harmony, delta)
+        if self._archive is not None and succeeded:
+            self._archive.record(harmony, fitness)
+        return fitness
+
+    def _evaluate_batch(self, harmonies, use_cache=True, owners=None):
+        """
+            Same as _evaluate(), but for a list of harmonies. Harmonies that aren't cached are evaluated with a single call to
+            get_fitness_batch(). owners is an optional list of the HarmonySearch each harmony belongs to, which its evaluation is
+            counted for (see _call_objective_batch()); by default, they're all counted for this one.
+        """
+        if not harmonies:
+            return list()
+        if owners is None:
+            owners = [self] * len(harmonies)
+        if self._archive is None:
+            return [fitness for fitness, _ in self._call_objective_batch(harmonies, owners)]
+        fitnesses = [self._archive.lookup(harmony) if self._cache and use_cache else None for harmony in harmonies]
+        missing = [i for i, fitness in enumerate(fitnesses) if fitness is None]
+        if missing:
+            for i, (fitness, succeeded) in zip(missing, self._call_objective_batch([harmonies[i] for i in missing],
+                                                                                   [owners[i] for i in missing])):
+                fitnesses[i] = fitness
+                if succeeded:
+                    self._archive.record(harmonies[i], fitness)
+        return fitnesses
+
+    def _call_objective(self, harmony, delta=None, fidelity=None):
+        """
+            Call get_fitness() (or get_fitness_delta() with the arguments in delta, or get_fitness() at the given fidelity) with the
+            configured timeout and retries. Return the fitness and whether the evaluation succeeded.
+        """
+        if delta is not None:
+            function, argument = self._call_fitness_delta, delta
+        elif fidelity is not None:
+            function, argument = lambda vector: self._obj_fun.get_fitness(vector, fidelity=fidelity), harmony
+        else:
+            function, argument = self._obj_fun.get_fitness, harmony
+        for attempt in range(self._max_retries + 1):
+            if fidelity is None:
+                self._num_evaluations += 1
+            else:
+                self._num_low_fidelity_evaluations += 1
+            try:
+                fitness = _call_with_timeout(function, argument, self._evaluation_timeout)
+                if delta is not None:
+                    self._num_delta_evaluations += 1
+                return fitness, True
+            except Exception:
+                if attempt == self._max_retries:
+                    self._num_failed_evaluations += 1
+                    if self._failure_fitness is None:
+                        raise
+        return self._failure_fitness, False
+
+    def _screen(self, harmony):
+        """
+            Multi-fidelity screening (see __init__()): evaluate harmony at low fidelity and return its high-fidelity fitness if it's
+            promoted, or None if it isn't.
+        """
+        low_fidelity_fitness = self._call_objective(harmony, fidelity='low')[0]
+        for i, value in enumerate(self._low_fidelity_memory):
+            if value is None:
+                self._low_fidelity_memory[i] = self._call_objective(self._harmony_memory[i][0], fidelity='low')[0]
+        if self._obj_fun.maximize():
+            promoted = low_fidelity_fitness + self._promotion_margin > min(self._low_fidelity_memory)
+        else:
+            promoted = low_fidelity_fitness - self._promotion_margin < max(self._low_fidelity_memory)
+        if not promoted:
+            return None
+        self._num_promotions += 1
+        self._screened = (harmony, low_fidelity_fitness)
+        return self._evaluate_improvisation(harmony)
+
+    def _call_fitness_delta(self, delta):
+        return self._obj_fun.get_fitness_delta(*delta)
+
+    def _call_objective_batch(self, harmonies, owners=None):
+        """
+            Same as _call_objective(), but for a list of harmonies evaluated with get_fitness_batch(). If the batch fails and failures are
+            tolerated, the harmonies are evaluated one at a time so that only the ones that actually fail are given failure_fitness.
+
+            harmony_search_batched() evaluates the harmonies of all its runs together, so each harmony's evaluation (and failure) is
+            counted for the HarmonySearch in owners that it belongs to.
+        """
+        if owners is None:
+            owners = [self] * len(harmonies)
+        timeout = None if self._evaluation_timeout is None else self._evaluation_timeout * len(harmonies)
+        try:
+            fitnesses = _call_with_timeout(self._obj_fun.get_fitness_batch, harmonies, timeout)
+        except Exception:
+            if self._max_retries == 0 and self._failure_fitness is None:
+                raise
+        else:
+            # only counted once the batch has succeeded, since otherwise _call_objective() counts the harmonies one at a time
+            for owner in owners:
+                owner._num_evaluations += 1
+            return [(fitness, True) for fitness in fitnesses]
+        return [owner._call_objective(harmony) for owner, harmony in zip(owners, harmonies)]
+
+    def _statistics(self):
+        """
+            Return a dictionary of counters describing the run, which are summed over all runs in HarmonySearchResults.
+        """
+        return {'failed_evaluations': self._num_failed_evaluations, 'evaluations': self._num_evaluations, 'reevaluations': self._num_reevaluations,
+                'refreshes': self._num_refreshes, 'diversity_trace': self._diversity_trace, 'cancelled': self._cancelled,
+                'delta_evaluations': self._num_delta_evaluations, 'low_fidelity_evaluations': self._num_low_fidelity_evaluations,
+                'promotions': self._num_promotions, 'objective_changes': self._num_objective_changes}
+
+    def _record_generation(self, generation):
+        """
+            Save a snapshot of harmony_memory, either in harmony_history or, if a history writer was given, on disk.
+        """
+        if not self._record_history:
+            pass
+        elif self._history is not None:
+            self._history.append(generation, self._harmony_memory)
         else:
-            initial_harmonies = list()
-            for i in range(0, self._obj_fun.get_hms()):
-                harmony = list()
-                for j in range(0, self._obj_fun.get_num_parameters()):
-                    self._random_selection(harmony, j)
-                initial_harmonies.append(harmony)
+            harmony_list = {'gen': generation, 'harmonies': copy.deepcopy(self._harmony_memory)}
+            self._harmony_history.append(harmony_list)
+        if self._track_diversity:
+            self._diversity_trace.append((self._num_imp, self._diversity()))
+
+    def _reset_diversity(self):
+        """
+            Compute the statistics behind _diversity() from scratch. They're then kept up to date by _update_diversity().
+
+            For each continuous parameter, the sum and sum of squares of its values in harmony_memory are kept (relative to the lower bound,
+            to limit rounding errors). For each discrete parameter, the number of times each value occurs is kept. Parameters that aren't
+            variable, or that can only take one value, are ignored.
+        """
+        hms = self._obj_fun.get_hms()
+        # decode the harmonies once rather than once per parameter (harmony_memory may decode them on access; see discrete.py)
+        harmonies = [harmony for harmony, _ in self._harmony_memory]
+        self._diversity_parameters = list()
+        self._diversity_stats = list()
+        self._diversity_terms = list()
+        for i in range(self._obj_fun.get_num_parameters()):
+            if not self._obj_fun.is_variable(i):
+                continue
+            if self._obj_fun.is_discrete(i):
+                max_unique = min(hms, self._obj_fun.get_num_discrete_values(i)) - 1
+                if max_unique < 1:
+                    continue
+                counts = dict()
+                for harmony in harmonies:
+                    counts[harmony[i]] = counts.get(harmony[i], 0) + 1
+                stats = [counts, max_unique]
+            else:
+                lower_bound = self._obj_fun.get_lower_bound(i)
+                value_range = self._obj_fun.get_upper_bound(i) - lower_bound
+                if value_range <= 0:
+                    continue
+                values = [harmony[i] - lower_bound for harmony in harmonies]
+                stats = [sum(values), sum(v * v for v in values), lower_bound, value_range]
+            self._diversity_parameters.append(i)
+            self._diversity_stats.append(stats)
+            self._diversity_terms.append(self._diversity_term(stats))
+        self._diversity_total = sum(self._diversity_terms)
+
+    def _diversity_term(self, stats):
+        """
+            Return the diversity of one parameter. For a continuous parameter, this is the standard deviation of its values relative to that
+            of a uniform distribution over its range, and for a discrete parameter, it's the number of distinct values beyond the first,
+            relative to the maximum possible. Either way, a freshly initialized memory is close to 1 and a collapsed one is 0.
+        """
+        if len(stats) == 2:
+            counts, max_unique = stats
+            return (len(counts) - 1) / float(max_unique)
+        total, total_squares, _, value_range = stats
+        hms = self._obj_fun.get_hms()
+        variance = max(0.0, total_squares / hms - (total / hms) ** 2)
+        return math.sqrt(variance * 12.0) / value_range
+
+    def _update_diversity(self, old_harmony, new_harmony):
+        """
+            Update the diversity statistics after old_harmony was replaced by new_harmony. This takes O(num_parameters) time rather than
+            the O(hms * num_parameters) needed to recompute them.
+        """
+        for k, i in enumerate(self._diversity_parameters):
+            stats = self._diversity_stats[k]
+            if len(stats) == 2:
+                counts = stats[0]
+                counts[old_harmony[i]] -= 1
+                if not counts[old_harmony[i]]:
+                    del counts[old_harmony[i]]
+                counts[new_harmony[i]] = counts.get(new_harmony[i], 0) + 1
+            else:
+                old_value = old_harmony[i] - stats[2]
+                new_value = new_harmony[i] - stats[2]
+                stats[0] += new_value - old_value
+                stats[1] += new_value * new_value - old_value * old_value
+            term = self._diversity_term(stats)
+            self._diversity_total += term - self._diversity_terms[k]
+            self._diversity_terms[k] = term
 
-        for i in range(0, self._obj_fun.get_hms()):
-            fitness = self._obj_fun.get_fitness(initial_harmonies[i])
-            self._harmony_memory.append((initial_harmonies[i], fitness))
+    def _diversity(self):
+        """
+            Return the diversity of harmony_memory: the mean diversity of its parameters (see _diversity_term()).
+        """
+        if not self._diversity_parameters:
+            return 0.0
+        return self._diversity_total / len(self._diversity_parameters)
 
-        harmony_list = {'gen': 0, 'harmonies': copy.deepcopy(self._harmony_memory)}
-        self._harmony_history.append(harmony_list)
+    def _refresh_memory(self):
+        """
+            Replace the worst refresh_fraction of harmony_memory with new harmonies from get_value().
+        """
+        num_refreshed = max(1, int(self._refresh_fraction * self._obj_fun.get_hms()))
+        order = sorted(range(len(self._harmony_memory)), key=lambda i: self._harmony_memory[i][1], reverse=not self._obj_fun.maximize())
+        harmonies = random_harmonies(self._obj_fun, num_refreshed)
+        for i, harmony, fitness in zip(order, harmonies, self._evaluate_batch(harmonies)):
+            self._replace(i, harmony, fitness)
+        self._reset_diversity()  # start from exact values again, so rounding errors can't accumulate
+        self._last_refresh = self._num_imp
+        self._num_refreshes += 1
 
     def _random_selection(self, harmony, i):
         """
@@ -226,10 +1574,14 @@ class HarmonySearch(object):
 
     def _memory_consideration(self, harmony, i):
         """
-            Randomly choose a note previously played.
+            Randomly choose a note previously played. Return the index of the harmony in harmony_memory it was taken from.
         """
-        memory_index = random.randint(0, self._obj_fun.get_hms() - 1)
+        if self._selection is not None:
+            memory_index = self._selection.sample()
+        else:
+            memory_index = int(random.random() * len(self._harmony_memory))
         harmony.append(self._harmony_memory[memory_index][0][i])
+        return memory_index
 
     def _pitch_adjustment(self, harmony, i):
         """
@@ -243,37 +1595,131 @@ class HarmonySearch(object):
             For example, suppose that it is decided via coin flip that the pitch will be adjusted down. Also suppose that mpap is set to 0.25.
             This means that the maximum value the pitch can be dropped will be 25% of the difference between the lower bound and the current
             pitch. mpai functions similarly, only it relies on indices of the possible values instead.
+
+            Random integers in [0, k] are drawn as int(random() * (k + 1)), which is much cheaper than random.randint().
         """
-        if(self._obj_fun.is_variable(i)):
-            if self._obj_fun.is_discrete(i):
+        pitch_range = self._pitch_ranges[i]
+        if pitch_range is not None:
+            rand = random.random
+            if pitch_range[0]:
                 current_index = self._obj_fun.get_index(i, harmony[i])
                 # discrete variable
-                if random.random() < 0.5:
+                if rand() < 0.5:
                     # adjust pitch down
-                    harmony[i] = self._obj_fun.get_value(i, current_index - random.randint(0, min(self._obj_fun.get_mpai(), current_index)))
+                    harmony[i] = self._obj_fun.get_value(i, current_index - int(rand() * (min(self._mpai, current_index) + 1)))
                 else:
                     # adjust pitch up
-                    harmony[i] = self._obj_fun.get_value(i, current_index + random.randint(0, min(self._obj_fun.get_mpai(), self._obj_fun.get_num_discrete_values(i) - current_index - 1)))
+                    harmony[i] = self._obj_fun.get_value(i, current_index + int(rand() * (min(self._mpai, pitch_range[1] - current_index - 1) + 1)))
             else:
                 # continuous variable
-                if random.random() < 0.5:
+                if rand() < 0.5:
                     # adjust pitch down
-                    harmony[i] -= (harmony[i] - self._obj_fun.get_lower_bound(i)) * random.random() * self._obj_fun.get_mpap()
+                    harmony[i] -= (harmony[i] - pitch_range[1]) * rand() * self._mpap
                 else:
                     # adjust pitch up
-                    harmony[i] += (self._obj_fun.get_upper_bound(i) - harmony[i]) * random.random() * self._obj_fun.get_mpap()
+                    harmony[i] += (pitch_range[2] - harmony[i]) * rand() * self._mpap
 
     def _update_harmony_memory(self, considered_harmony, considered_fitness):
         """
             Update the harmony memory if necessary with the given harmony. If the given harmony is better than the worst
             harmony in memory, replace it. This function doesn't allow duplicate harmonies in memory.
         """
-        if (considered_harmony, considered_fitness) not in self._harmony_memory:
-            worst_index = None
-            worst_fitness = float('+inf') if self._obj_fun.maximize() else float('-inf')
-            for i, (harmony, fitness) in enumerate(self._harmony_memory):
-                if (self._obj_fun.maximize() and fitness < worst_fitness) or (not self._obj_fun.maximize() and fitness > worst_fitness):
-                    worst_index = i
-                    worst_fitness = fitness
+        if self._noise_handling:
+            self._update_noisy_harmony_memory(considered_harmony, considered_fitness)
+        elif (considered_harmony, considered_fitness) not in self._harmony_memory:
+            worst_index, worst_fitness = self._worst()
             if (self._obj_fun.maximize() and considered_fitness > worst_fitness) or (not self._obj_fun.maximize() and considered_fitness < worst_fitness):
-                self._harmony_memory[worst_index] = (considered_harmony, considered_fitness)
+                self._replace(worst_index, considered_harmony, considered_fitness)
+
+    def _worst(self):
+        """
+            Return the index of the worst harmony in harmony_memory and its fitness.
+        """
+        worst_index = None
+        worst_fitness = float('+inf') if self._obj_fun.maximize() else float('-inf')
+        for i, (harmony, fitness) in enumerate(self._harmony_memory):
+            if (self._obj_fun.maximize() and fitness < worst_fitness) or (not self._obj_fun.maximize() and fitness > worst_fitness):
+                worst_index = i
+                worst_fitness = fitness
+        return worst_index, worst_fitness
+
+    def _replace(self, index, harmony, fitness, stats=None):
+        """
+            Put the given harmony in harmony_memory at the given index, along with its fitness samples if noise is being handled.
+        """
+        if self._track_diversity:
+            self._update_diversity(self._harmony_memory[index][0], harmony)
+        self._harmony_memory[index] = (harmony, fitness)
+        if self._selection is not None:
+            self._selection.update(index, fitness)
+        if self._noise_handling:
+            self._memory_stats[index] = stats if stats is not None else [1, fitness, 0.0]
+        if self._low_fidelity_memory is not None:
+            # the low-fidelity fitness is known if the harmony was just screened; otherwise, it's evaluated when it's needed
+            self._low_fidelity_memory[index] = self._screened[1] if self._screened is not None and self._screened[0] is harmony else None
+
+    def _update_noisy_harmony_memory(self, considered_harmony, considered_fitness):
+        """
+            Noise-aware version of _update_harmony_memory(). A harmony that's already in memory just contributes another sample to its mean.
+            Otherwise, the new harmony replaces the worst one if its mean fitness is better, but while the difference between the two means
+            is within confidence standard errors, whichever mean is less certain is re-evaluated first (racing), up to max_reevaluations
+            times. Until some harmony has been sampled twice, nothing is known about the noise, so every decision counts as unclear.
+
+            The variance of a mean with a single sample is estimated from the pooled variance of all repeated samples.
+        """
+        for i, (harmony, _) in enumerate(self._harmony_memory):
+            if harmony == considered_harmony:
+                self._add_sample(self._memory_stats[i], considered_fitness)
+                self._harmony_memory[i] = (harmony, self._memory_stats[i][1])
+                if self._selection is not None:
+                    self._selection.update(i, self._memory_stats[i][1])
+                return
+        sign = 1 if self._obj_fun.maximize() else -1
+        candidate = [1, considered_fitness, 0.0]
+        reevaluations = 0
+        while True:
+            worst_index, _ = self._worst()
+            incumbent = self._memory_stats[worst_index]
+            difference = sign * (candidate[1] - incumbent[1])  # positive if the candidate is better
+            candidate_error = self._squared_standard_error(candidate)
+            incumbent_error = self._squared_standard_error(incumbent)
+            unclear = candidate_error is None or abs(difference) <= self._confidence * math.sqrt(candidate_error + incumbent_error)
+            if not unclear or reevaluations >= self._max_reevaluations:
+                break
+            reevaluations += 1
+            if candidate_error is None or candidate_error >= incumbent_error:
+                self._add_sample(candidate, self._call_objective(considered_harmony)[0])
+            else:
+                harmony = self._harmony_memory[worst_index][0]
+                self._add_sample(incumbent, self._call_objective(harmony)[0])
+                self._harmony_memory[worst_index] = (harmony, incumbent[1])
+                if self._selection is not None:
+                    self._selection.update(worst_index, incumbent[1])
+        self._num_reevaluations += reevaluations
+        if difference > 0:
+            self._replace(worst_index, considered_harmony, candidate[1], candidate)
+
+    def _add_sample(self, stats, fitness):
+        """
+            Add a fitness sample to the [count, mean, sum of squared deviations] of a harmony (Welford's algorithm), and to the pooled noise
+            estimate.
+        """
+        count, mean, m2 = stats
+        count += 1
+        delta = fitness - mean
+        mean += delta / count
+        new_m2 = m2 + delta * (fitness - mean)
+        self._noise_m2 += new_m2 - m2
+        self._noise_df += 1
+        stats[:] = [count, mean, new_m2]
+
+    def _squared_standard_error(self, stats):
+        """
+            Return the squared standard error of the mean fitness of a harmony, or None if the noise can't be estimated yet.
+        """
+        count, _, m2 = stats
+        if count > 1:
+            return m2 / (count - 1) / count
+        if self._noise_df == 0:
+            return None
+        return self._noise_m2 / self._noise_df
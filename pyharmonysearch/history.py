@@ -0,0 +1,242 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from array import array
+import json
+import mmap
+import os
+
+# Every value is stored as a native-endian C double, so a store is meant to be read on the machine that wrote it.
+_ITEM_SIZE = array('d').itemsize
+
+
+class HarmonyHistoryStore(object):
+
+    """
+        An append-only, on-disk store for harmony histories. Keeping every generation of every run in RAM gets expensive
+        quickly for long runs, so instead each generation is streamed to disk as soon as it's produced and read back lazily
+        using mmap.
+
+        A store is a directory. meta.json records the harmony memory size and the number of parameters, which fix the size of
+        one generation record. Each run gets its own raw file of doubles (run_<k>.bin) that only ever grows, so the record count
+        doubles as the index. Within a record, values are stored column by column: the generation number, then each
+        parameter for all hms harmonies, then all hms fitness values. This makes pulling a single column out of a generation cheap.
+
+        Because values are stored as doubles, every value a harmony can take must be convertible with float().
+
+        To create a store, pass hms and num_parameters. To open an existing store for reading, pass only the path:
+
+        >>> store = HarmonyHistoryStore('history')
+        >>> store.run(0)[-1]['harmonies'][0]
+        ([0.02, -0.99], 3.99)
+    """
+
+    def __init__(self, path, hms=None, num_parameters=None):
+        self._path = path
+        meta_path = os.path.join(path, 'meta.json')
+        if hms is None or num_parameters is None:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self._hms = meta['hms']
+            self._num_parameters = meta['num_parameters']
+        else:
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                if meta['hms'] != hms or meta['num_parameters'] != num_parameters:
+                    raise ValueError('Existing history store at {} was created with a different hms or number of parameters.'.format(path))
+            else:
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+                with open(meta_path, 'w') as f:
+                    json.dump({'hms': hms, 'num_parameters': num_parameters}, f)
+            self._hms = hms
+            self._num_parameters = num_parameters
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def hms(self):
+        return self._hms
+
+    @property
+    def num_parameters(self):
+        return self._num_parameters
+
+    def run_path(self, run):
+        return os.path.join(self._path, 'run_{}.bin'.format(run))
+
+    def runs(self):
+        """
+            Return the sorted indices of all runs that have written at least one file to this store.
+        """
+        runs = list()
+        for name in os.listdir(self._path):
+            if name.startswith('run_') and name.endswith('.bin'):
+                runs.append(int(name[4:-4]))
+        return sorted(runs)
+
+    def writer(self, run):
+        """
+            Return a HistoryWriter that streams generations for the given run into this store.
+        """
+        return HistoryWriter(self._path, run, self._hms, self._num_parameters)
+
+    def run(self, run):
+        """
+            Return a lazy, read-only view of the history of the given run.
+        """
+        return RunHistory(self._path, run, self._hms, self._num_parameters)
+
+
+class HistoryWriter(object):
+
+    """
+        Streams generations of a single run to its file in a HarmonyHistoryStore. The file is opened for each write and closed
+        again right after, so a writer holds no file handle between generations: a writer is cheap to create and can be pickled and
+        sent to another process at any time, and thousands of runs in one process (e.g., harmony_search_batched) don't run out of
+        file descriptors. The first write truncates any file left behind by an earlier run with the same index.
+    """
+
+    def __init__(self, path, run, hms, num_parameters):
+        self._path = path
+        self._run = run
+        self._hms = hms
+        self._num_parameters = num_parameters
+        self._truncate = True
+
+    def append(self, generation, harmony_memory):
+        """
+            Append one generation (a list of (harmony, fitness) tuples) to the run's file.
+        """
+        if len(harmony_memory) != self._hms:
+            raise ValueError('Harmony memory size does not match the history store.')
+        harmony_memory = list(harmony_memory)  # iterate over the memory only once, in case its harmonies are decoded on access
+        record = array('d', [generation])
+        for j in range(self._num_parameters):
+            record.extend(float(harmony[j]) for harmony, _ in harmony_memory)
+        record.extend(float(fitness) for _, fitness in harmony_memory)
+        # closing the file after every generation also lets readers follow a run while it's in progress
+        with open(os.path.join(self._path, 'run_{}.bin'.format(self._run)), 'wb' if self._truncate else 'ab') as f:
+            record.tofile(f)
+        self._truncate = False
+
+    def view(self):
+        """
+            Return a RunHistory for the run this writer is writing.
+        """
+        return RunHistory(self._path, self._run, self._hms, self._num_parameters)
+
+
+class RunHistory(object):
+
+    """
+        A lazy, read-only view of one run's history. It behaves like the list of {'gen': ..., 'harmonies': ...} dictionaries
+        that HarmonySearch keeps in memory, but each generation is only decoded when it's indexed. The file is memory-mapped,
+        and the map is refreshed if the file has grown, so a view of a run that's still in progress sees new generations.
+
+        Pickling a RunHistory only pickles its location, so it's cheap to pass between processes.
+    """
+
+    def __init__(self, path, run, hms, num_parameters):
+        self._path = path
+        self._run = run
+        self._hms = hms
+        self._num_parameters = num_parameters
+        self._record_size = 1 + hms * (num_parameters + 1)
+        self._map = None
+        self._values = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_map'] = None
+        state['_values'] = None
+        return state
+
+    def _file_name(self):
+        return os.path.join(self._path, 'run_{}.bin'.format(self._run))
+
+    def _refresh(self):
+        """
+            (Re)map the file if it has grown since it was last mapped. Partially written records at the end are ignored.
+        """
+        size = os.path.getsize(self._file_name())
+        size -= size % (self._record_size * _ITEM_SIZE)
+        if self._values is not None and len(self._values) * _ITEM_SIZE == size:
+            return
+        self.close()
+        if size:
+            with open(self._file_name(), 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self._values = memoryview(self._map).cast('d')
+        else:
+            self._values = memoryview(b'').cast('d')
+
+    def close(self):
+        if self._values is not None:
+            self._values.release()
+            self._values = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __len__(self):
+        self._refresh()
+        return len(self._values) // self._record_size
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        offset = self._offset(index)
+        columns = [self._values[offset + 1 + j * self._hms:offset + 1 + (j + 1) * self._hms].tolist() for j in range(self._num_parameters + 1)]
+        fitnesses = columns.pop()
+        harmonies = [list(harmony) for harmony in zip(*columns)] if columns else [list() for _ in range(self._hms)]
+        return {'gen': int(self._values[offset]), 'harmonies': list(zip(harmonies, fitnesses))}
+
+    def _offset(self, index):
+        num_generations = len(self)
+        if index < 0:
+            index += num_generations
+        if not 0 <= index < num_generations:
+            raise IndexError('generation index out of range')
+        return index * self._record_size
+
+    def get_parameter(self, index, j):
+        """
+            Return the values of parameter j for all harmonies in the given generation without decoding the rest of it.
+        """
+        offset = self._offset(index) + 1 + j * self._hms
+        return self._values[offset:offset + self._hms].tolist()
+
+    def get_fitnesses(self, index):
+        """
+            Return the fitness of every harmony in the given generation without decoding the rest of it.
+        """
+        offset = self._offset(index) + 1 + self._num_parameters * self._hms
+        return self._values[offset:offset + self._hms].tolist()
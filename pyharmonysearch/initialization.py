@@ -0,0 +1,246 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import random
+
+# Initializers used to fill the harmony memory. Each initializer takes the objective function and the number of harmonies
+# to generate, and returns a list of harmonies (lists of parameter values).
+#
+# Apart from random_harmonies(), which simply calls get_value() for every cell, the initializers first generate points in the
+# unit hypercube (one dimension per variable parameter) and then map them onto each parameter's range:
+#
+# * continuous parameters are scaled into [get_lower_bound(i), get_upper_bound(i)],
+# * discrete parameters are mapped onto the index range [0, get_num_discrete_values(i)) and looked up with get_value(i, j),
+# * parameters that aren't variable are filled in with get_value(i).
+#
+# The quasi-random sequences (Halton and Sobol) are deterministic, so each call randomizes them using the random module: Halton
+# digits are scrambled with random permutations, and Sobol points get a random shift (a Cranley-Patterson rotation). Separate
+# runs therefore start from different, but equally well spread, memories, and runs with a random seed remain reproducible.
+
+# Joe and Kuo's direction numbers for Sobol dimensions 2 through 21: (degree s, polynomial coefficients a, initial m_k).
+# See S. Joe and F. Y. Kuo, "Constructing Sobol sequences with better two-dimensional projections", SIAM J. Sci. Comput. 30,
+# 2635-2654 (2008).
+_SOBOL_DIRECTION_NUMBERS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+_SOBOL_BITS = 30
+SOBOL_MAX_DIMENSIONS = len(_SOBOL_DIRECTION_NUMBERS) + 1
+
+
+def random_harmonies(objective_function, num_harmonies):
+    """
+        The original initializer: every value of every harmony comes from get_value().
+    """
+    num_parameters = objective_function.get_num_parameters()
+    return [[objective_function.get_value(i) for i in range(num_parameters)] for _ in range(num_harmonies)]
+
+
+def latin_hypercube(objective_function, num_harmonies):
+    """
+        Latin hypercube sampling: the range of every variable parameter is split into num_harmonies strata, and each stratum is
+        used by exactly one harmony.
+    """
+    dimensions = len(_variable_parameters(objective_function))
+    columns = list()
+    for _ in range(dimensions):
+        strata = list(range(num_harmonies))
+        random.shuffle(strata)
+        columns.append([(stratum + random.random()) / num_harmonies for stratum in strata])
+    return _map_points(objective_function, list(zip(*columns)) if columns else [()] * num_harmonies)
+
+
+def halton(objective_function, num_harmonies):
+    """
+        Scrambled Halton sequence, using the first prime numbers as bases. Each digit position of each base gets its own random
+        permutation of the digits. Unscrambled (or merely shifted), the dimensions with large bases are strongly correlated
+        with each other for the first few hundred points, which would defeat the purpose for problems with many parameters.
+    """
+    primes = _primes(len(_variable_parameters(objective_function)))
+    permutations = [_digit_permutations(base, num_harmonies) for base in primes]
+    points = list()
+    for k in range(num_harmonies):
+        points.append([_scrambled_radical_inverse(k, base, digit_permutations)
+                       for base, digit_permutations in zip(primes, permutations)])
+    return _map_points(objective_function, points)
+
+
+def sobol(objective_function, num_harmonies):
+    """
+        Randomly shifted Sobol sequence. Direction numbers are built in for up to SOBOL_MAX_DIMENSIONS variable parameters; for
+        higher-dimensional problems, use latin_hypercube() or halton() instead.
+    """
+    dimensions = len(_variable_parameters(objective_function))
+    if dimensions > SOBOL_MAX_DIMENSIONS:
+        raise ValueError('Sobol initialization supports at most {} variable parameters.'.format(SOBOL_MAX_DIMENSIONS))
+    directions = [_sobol_directions(d) for d in range(dimensions)]
+    shifts = [random.random() for _ in range(dimensions)]
+    scale = float(1 << _SOBOL_BITS)
+    x = [0] * dimensions
+    points = list()
+    for k in range(num_harmonies):
+        points.append([(x[d] / scale + shifts[d]) % 1.0 for d in range(dimensions)])
+        # Gray code ordering: point k + 1 differs from point k by the direction number of the lowest zero bit of k
+        c = 0
+        while (k >> c) & 1:
+            c += 1
+        for d in range(dimensions):
+            x[d] ^= directions[d][c]
+    return _map_points(objective_function, points)
+
+
+def opposite_harmony(objective_function, harmony):
+    """
+        Return the opposite of the given harmony: continuous values are reflected about the center of their range, and discrete
+        values about the center of their index range. Parameters that aren't variable are left as they are.
+    """
+    opposite = list(harmony)
+    for i in _variable_parameters(objective_function):
+        if objective_function.is_discrete(i):
+            num_values = objective_function.get_num_discrete_values(i)
+            opposite[i] = objective_function.get_value(i, num_values - 1 - objective_function.get_index(i, harmony[i]))
+        else:
+            opposite[i] = objective_function.get_lower_bound(i) + objective_function.get_upper_bound(i) - harmony[i]
+    return opposite
+
+
+INITIALIZERS = {
+    'random': random_harmonies,
+    'latin_hypercube': latin_hypercube,
+    'halton': halton,
+    'sobol': sobol,
+}
+
+
+def get_initializer(initializer):
+    """
+        Resolve an initializer given either by name (a key of INITIALIZERS) or as a callable.
+    """
+    if callable(initializer):
+        return initializer
+    try:
+        return INITIALIZERS[initializer]
+    except KeyError:
+        raise ValueError('Unknown initializer {!r}; expected one of {}.'.format(initializer, ', '.join(sorted(INITIALIZERS))))
+
+
+def _variable_parameters(objective_function):
+    return [i for i in range(objective_function.get_num_parameters()) if objective_function.is_variable(i)]
+
+
+def _map_points(objective_function, points):
+    """
+        Map points in the unit hypercube (one coordinate per variable parameter) onto harmonies.
+    """
+    variable = set(_variable_parameters(objective_function))
+    harmonies = list()
+    for point in points:
+        coordinates = iter(point)
+        harmony = list()
+        for i in range(objective_function.get_num_parameters()):
+            if i not in variable:
+                harmony.append(objective_function.get_value(i))
+                continue
+            u = next(coordinates)
+            if objective_function.is_discrete(i):
+                num_values = objective_function.get_num_discrete_values(i)
+                harmony.append(objective_function.get_value(i, min(int(u * num_values), num_values - 1)))
+            else:
+                lower_bound = objective_function.get_lower_bound(i)
+                harmony.append(lower_bound + u * (objective_function.get_upper_bound(i) - lower_bound))
+        harmonies.append(harmony)
+    return harmonies
+
+
+def _primes(n):
+    primes = list()
+    candidate = 2
+    while len(primes) < n:
+        if all(candidate % p for p in primes if p * p <= candidate):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+def _digit_permutations(base, num_points):
+    """
+        Return a random permutation of range(base) for each digit position that's significant in double precision. Only the digits
+        that the first num_points indices actually have in each position (0 up to some m) are drawn, so for large bases, where most
+        positions only ever hold a 0, this is far cheaper than shuffling all of range(base) for every position.
+    """
+    permutations = list()
+    weight = 1  # base ** position
+    while weight < 1 << 53:
+        num_digits = min(base, max(1, -(-num_points // weight)))
+        permutations.append(random.sample(range(base), num_digits))
+        weight *= base
+    return permutations
+
+
+def _scrambled_radical_inverse(k, base, digit_permutations):
+    """
+        The radical inverse of k in the given base, with the j-th digit replaced by digit_permutations[j][digit]. Digits beyond the
+        last one of k are zeros, which are permuted as well, so every digit position is randomized.
+    """
+    inverse = 0.0
+    f = 1.0 / base
+    for permutation in digit_permutations:
+        k, digit = divmod(k, base)
+        inverse += permutation[digit] * f
+        f /= base
+    return min(inverse, 1.0 - 2 ** -53)
+
+
+def _sobol_directions(dimension):
+    """
+        Return the _SOBOL_BITS direction numbers (already shifted into integer form) for the given 0-indexed dimension.
+    """
+    if dimension == 0:
+        return [1 << (_SOBOL_BITS - 1 - k) for k in range(_SOBOL_BITS)]
+    s, a, m = _SOBOL_DIRECTION_NUMBERS[dimension - 1]
+    v = [m[k] << (_SOBOL_BITS - 1 - k) for k in range(s)]
+    for k in range(s, _SOBOL_BITS):
+        value = v[k - s] ^ (v[k - s] >> s)
+        for l in range(1, s):
+            if (a >> (s - 1 - l)) & 1:
+                value ^= v[k - l]
+        v.append(value)
+    return v
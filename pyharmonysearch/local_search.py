@@ -0,0 +1,107 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+def pattern_search(objective_function, harmony, fitness, evaluate, budget, initial_step=0.05, min_step=1e-9):
+    """
+        Refine a harmony with a compass (pattern) search, a derivative-free local search. Starting from harmony, whose fitness is fitness,
+        each variable parameter in turn is moved up and then down by its step, and the first move that improves the fitness is kept. When
+        a full pass over the parameters doesn't improve anything, the steps are halved. The search stops when budget evaluations have been
+        used or all steps have shrunk below their minimum.
+
+        Continuous steps start at initial_step times the parameter's range and stop at min_step times the range; moves are clipped to
+        [get_lower_bound(i), get_upper_bound(i)]. Discrete parameters move along their index (so they always stay on their value grid),
+        starting at initial_step times the number of values (at least 1) and stopping once a step of 1 index no longer helps.
+
+        evaluate is the function used to compute the fitness of a harmony. Return the best harmony found, its fitness, and the number of
+        evaluations used.
+    """
+    maximize = objective_function.maximize()
+    parameters = list()
+    steps = list()
+    min_steps = list()
+    for i in range(objective_function.get_num_parameters()):
+        if not objective_function.is_variable(i):
+            continue
+        if objective_function.is_discrete(i):
+            num_values = objective_function.get_num_discrete_values(i)
+            if num_values < 2:
+                continue
+            steps.append(max(1, int(initial_step * num_values)))
+            min_steps.append(1)
+        else:
+            value_range = objective_function.get_upper_bound(i) - objective_function.get_lower_bound(i)
+            if value_range <= 0:
+                continue
+            steps.append(initial_step * value_range)
+            min_steps.append(min_step * value_range)
+        parameters.append(i)
+
+    best_harmony = list(harmony)
+    best_fitness = fitness
+    evaluations = 0
+    while evaluations < budget and any(step >= minimum for step, minimum in zip(steps, min_steps)):
+        improved = False
+        for k, i in enumerate(parameters):
+            if steps[k] < min_steps[k]:
+                continue
+            for direction in (1, -1):
+                if evaluations >= budget:
+                    break
+                candidate = _move(objective_function, best_harmony, i, direction * steps[k])
+                if candidate is None:
+                    continue
+                candidate_fitness = evaluate(candidate)
+                evaluations += 1
+                if (maximize and candidate_fitness > best_fitness) or (not maximize and candidate_fitness < best_fitness):
+                    best_harmony = candidate
+                    best_fitness = candidate_fitness
+                    improved = True
+                    break
+        if not improved:
+            for k, i in enumerate(parameters):
+                if objective_function.is_discrete(i):
+                    # discrete steps can't go below 1 index, so a step of 1 that didn't help ends the search in this parameter
+                    steps[k] = steps[k] // 2 if steps[k] > 1 else 0
+                else:
+                    steps[k] /= 2.0
+    return best_harmony, best_fitness, evaluations
+
+
+def _move(objective_function, harmony, i, step):
+    """
+        Return a copy of harmony with parameter i moved by step (in index units for discrete parameters), or None if that doesn't change it.
+    """
+    candidate = list(harmony)
+    if objective_function.is_discrete(i):
+        current_index = objective_function.get_index(i, harmony[i])
+        new_index = min(max(current_index + step, 0), objective_function.get_num_discrete_values(i) - 1)
+        if new_index == current_index:
+            return None
+        candidate[i] = objective_function.get_value(i, new_index)
+    else:
+        new_value = min(max(harmony[i] + step, objective_function.get_lower_bound(i)), objective_function.get_upper_bound(i))
+        if new_value == harmony[i]:
+            return None
+        candidate[i] = new_value
+    return candidate
@@ -28,9 +28,15 @@ class ObjectiveFunctionInterface(object):
 
     """
         This interface must be implemented by you. This defines the objective function HS optimizes.
+
+        The HS settings (get_hmcr(), get_par(), get_mpai(), get_mpap()) and the properties of each parameter (is_variable(),
+        is_discrete(), get_num_discrete_values(), and the bounds) are read once whenever a run starts or continues (resume(), the
+        next segment or racing round, objective_changed()), not for every note. Settings that change while a run is in progress
+        (e.g., a PAR or bandwidth that depends on the improvisation count, as in improved harmony search) therefore only take effect
+        the next time the run continues. To vary them during a run, run it in pieces with resume().
     """
 
-    def get_fitness(self, vector):
+    def get_fitness(self, vector, fidelity=None):
         """
             Return the objective function value given a solution vector containing each decision variable. In practice,
             vector should be a list of parameters.
@@ -39,9 +45,46 @@ class ObjectiveFunctionInterface(object):
 
             >>> print obj_fun.fitness([4, 7])
             -76
+
+            The fidelity argument is optional and only used with HarmonySearch's multi_fidelity option. It's then 'low' when a cheaper,
+            less accurate estimate (e.g., a coarse simulation) is wanted to screen a new harmony; otherwise, it's None (full fidelity).
+            Objective functions that don't support multiple fidelities can leave it out.
         """
         raise NotImplementedError(inspect.stack()[0][3])
 
+    def get_fitness_batch(self, vectors):
+        """
+            Return the objective function values of a list of solution vectors, in the same order. HS calls this whenever it has several
+            harmonies to evaluate at once (e.g., when filling the harmony memory).
+
+            Implementing this is optional. By default, get_fitness() is simply called on each vector, but if your objective function can be
+            vectorized or evaluated in parallel, overriding this can be considerably faster.
+
+            >>> print obj_fun.get_fitness_batch([[4, 7], [0, -1]])
+            [-76, 4]
+        """
+        return [self.get_fitness(vector) for vector in vectors]
+
+    def get_fitness_delta(self, base_vector, base_fitness, changed_indices, new_values):
+        """
+            Return the objective function value of base_vector with the parameters at changed_indices set to new_values, given that
+            base_fitness is the objective function value of base_vector itself. Most new harmonies are largely copied from one harmony in
+            the harmony memory, and HS calls this instead of get_fitness() when only a few of their parameters differ from it.
+
+            Implementing this is optional; HS only uses it if it's overridden. By default, the new vector is built and passed to
+            get_fitness(). For objective functions that are a sum of terms (e.g., separable ones), overriding this to recompute only the
+            terms that changed can save most of the work on problems with many parameters. For example, for the sum of x^2:
+
+            >>> print obj_fun.get_fitness_delta([1, 2, 3], 14, [0, 2], [0, 1])
+            5
+
+            base_vector must not be modified. Note that rounding errors can accumulate over many incremental evaluations.
+        """
+        vector = list(base_vector)
+        for i, value in zip(changed_indices, new_values):
+            vector[i] = value
+        return self.get_fitness(vector)
+
     def get_value(self, i, j=None):
         """
             Get a valid value of parameter i. You can return values any way you like - uniformly at random, according to some
@@ -109,7 +152,8 @@ class ObjectiveFunctionInterface(object):
             >>> print obj_fun.lower_bound(1)
             -1000
 
-            This will only be called for continuous variables in the pitch adjustment step.
+            This will only be called for continuous variables, for the pitch adjustment step. It's read once when a run starts or
+            continues rather than for every note (see the class docstring).
         """
         raise NotImplementedError(inspect.stack()[0][3])
 
@@ -117,7 +161,8 @@ class ObjectiveFunctionInterface(object):
         """
             Return the upper bound of parameter i.
 
-            This will only be called for continuous variables in the pitch adjustment step.
+            This will only be called for continuous variables, for the pitch adjustment step. Like the lower bound, it's read once
+            when a run starts or continues.
         """
         raise NotImplementedError(inspect.stack()[0][3])
 
@@ -183,12 +228,17 @@ class ObjectiveFunctionInterface(object):
     def get_hmcr(self):
         """
             Return the harmony memory considering rate. This represents the proportion of memory consideration calls vs. random selection calls.
+
+            Like the other HS settings, this is read once when a run starts or continues, not for every note (see the class docstring).
         """
         raise NotImplementedError(inspect.stack()[0][3])
 
     def get_par(self):
         """
             Return the pitch adjusting rate. This represents how often pitch adjustment will occur if memory consideration has already been done.
+
+            This is read once when a run starts or continues, so a PAR that changes with the improvisation count (as in improved
+            harmony search) only takes effect the next time the run continues (see the class docstring).
         """
         raise NotImplementedError(inspect.stack()[0][3])
 
@@ -202,6 +252,8 @@ class ObjectiveFunctionInterface(object):
         """
             Return the maximum pitch adjustment index. This determines the range from which pitch adjustment may occur for discrete variables. Also known as
             discrete bandwidth.
+
+            This is read once when a run starts or continues (see the class docstring).
         """
         raise NotImplementedError(inspect.stack()[0][3])
 
@@ -209,6 +261,9 @@ class ObjectiveFunctionInterface(object):
         """
             Return the maximum pitch adjustment proportion. This determines the range from which pitch adjustment may occur for continuous variables. Also known as
             continuous bandwidth.
+
+            This is read once when a run starts or continues, so a bandwidth that shrinks over the course of a run only changes between
+            pieces of it (see the class docstring).
         """
         raise NotImplementedError(inspect.stack()[0][3])
 
@@ -0,0 +1,172 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from bisect import bisect_left, insort
+from functools import partial
+import math
+import random
+
+# Memory selection strategies: how memory consideration chooses the harmony in harmony_memory that a note is taken from. The original
+# HS chooses uniformly, so weak harmonies are recombined as often as the best ones. The other strategies favor better harmonies:
+#
+# * 'rank': linear ranking; the best harmony is chosen about twice as often as the median one and the worst almost never. Only the
+#   order of the fitness values matters.
+# * 'proportional': the chance of choosing a harmony grows linearly with how much better its fitness is than the worst one's.
+# * 'tournament': tournament_size harmonies are drawn uniformly and the best of them is chosen; larger tournaments mean more pressure.
+#
+# A note is chosen for every parameter of every improvisation, so sampling must be cheap, and the structures behind it are updated
+# whenever a harmony in memory is replaced (see HarmonySearch._replace()) instead of being rebuilt. Each selector is created with
+# the fitness values in memory and has update(index, fitness) and sample(), which returns the index of the chosen harmony.
+SELECTIONS = ('uniform', 'rank', 'proportional', 'tournament')
+
+
+def get_selection(memory_selection, tournament_size=2):
+    """
+        Return a function that creates the selector for memory_selection (one of SELECTIONS) from the fitness values in memory and
+        whether the objective is maximized, or None for uniform selection, which HarmonySearch does itself.
+    """
+    if memory_selection == 'uniform':
+        return None
+    if memory_selection == 'rank':
+        return RankSelection
+    if memory_selection == 'proportional':
+        return ProportionalSelection
+    if memory_selection == 'tournament':
+        if tournament_size < 1:
+            raise ValueError('tournament_size must be at least 1.')
+        return partial(TournamentSelection, size=tournament_size)
+    raise ValueError('Unknown memory_selection {!r}; expected one of {}.'.format(memory_selection, ', '.join(SELECTIONS)))
+
+
+class RankSelection(object):
+
+    """
+        Linear ranking. The harmonies are kept sorted by fitness, so a rank can be drawn in O(1) from the linearly decreasing
+        distribution and looked up directly. Replacing a harmony moves it in the sorted order with a binary search (plus a list
+        insertion, which is a fast memmove even for a large memory).
+    """
+
+    def __init__(self, fitnesses, maximize):
+        self._sign = -1 if maximize else 1  # sort keys are ascending, best first
+        self._keys = [self._sign * fitness for fitness in fitnesses]
+        self._order = sorted((key, index) for index, key in enumerate(self._keys))
+
+    def update(self, index, fitness):
+        del self._order[bisect_left(self._order, (self._keys[index], index))]
+        self._keys[index] = self._sign * fitness
+        insort(self._order, (self._keys[index], index))
+
+    def sample(self):
+        # the inverse of the CDF of the density 2 (1 - x) on [0, 1)
+        num_harmonies = len(self._order)
+        rank = int(num_harmonies * (1.0 - math.sqrt(1.0 - random.random())))
+        return self._order[min(rank, num_harmonies - 1)][1]
+
+
+class ProportionalSelection(object):
+
+    """
+        Fitness-proportional (roulette wheel) selection using a Fenwick tree of weights, so both sampling and updating take
+        O(log hms) time. A harmony's weight is how much better its fitness is than a baseline a bit below the worst fitness in memory
+        (so that the worst harmony can still be chosen). The baseline is only recomputed, along with the tree, every hms updates or when
+        a harmony falls below it; in between, the memory only gets better, so the weights stay valid.
+    """
+
+    def __init__(self, fitnesses, maximize):
+        self._sign = 1 if maximize else -1
+        self._fitnesses = list(fitnesses)
+        self._rebuild()
+
+    def _rebuild(self):
+        scores = [self._sign * fitness for fitness in self._fitnesses]
+        finite = [score for score in scores if math.isfinite(score)]
+        lowest = min(finite) if finite else 0.0
+        spread = max(finite) - lowest if finite else 0.0
+        self._baseline = lowest - (spread / len(scores) if spread > 0 else 1.0)
+        # failed evaluations (e.g., a failure_fitness of -inf when maximizing) get no weight
+        self._weights = [score - self._baseline if math.isfinite(score) else 0.0 for score in scores]
+        num_harmonies = len(self._weights)
+        self._tree = [0.0] + self._weights
+        for i in range(1, num_harmonies + 1):
+            parent = i + (i & -i)
+            if parent <= num_harmonies:
+                self._tree[parent] += self._tree[i]
+        self._total = sum(self._weights)
+        self._mask = 1 << (num_harmonies.bit_length() - 1)
+        self._num_updates = 0
+
+    def update(self, index, fitness):
+        self._fitnesses[index] = fitness
+        self._num_updates += 1
+        score = self._sign * fitness
+        if not math.isfinite(score) or score <= self._baseline or self._num_updates >= len(self._weights):
+            self._rebuild()
+            return
+        change = score - self._baseline - self._weights[index]
+        self._weights[index] += change
+        self._total += change
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += change
+            i += i & -i
+
+    def sample(self):
+        if self._total <= 0:
+            return int(random.random() * len(self._weights))
+        remaining = random.random() * self._total
+        position = 0
+        mask = self._mask
+        while mask:
+            following = position + mask
+            if following < len(self._tree) and self._tree[following] <= remaining:
+                position = following
+                remaining -= self._tree[following]
+            mask >>= 1
+        return min(position, len(self._weights) - 1)
+
+
+class TournamentSelection(object):
+
+    """
+        Tournament selection: draw size harmonies uniformly (with replacement) and choose the best. This takes O(size) time and only
+        needs the fitness values.
+    """
+
+    def __init__(self, fitnesses, maximize, size=2):
+        self._sign = 1 if maximize else -1
+        self._scores = [self._sign * fitness for fitness in fitnesses]
+        self._size = size
+
+    def update(self, index, fitness):
+        self._scores[index] = self._sign * fitness
+
+    def sample(self):
+        rand = random.random
+        scores = self._scores
+        num_harmonies = len(scores)
+        best = int(rand() * num_harmonies)
+        for _ in range(self._size - 1):
+            candidate = int(rand() * num_harmonies)
+            if scores[candidate] > scores[best]:
+                best = candidate
+        return best
@@ -0,0 +1,195 @@
+"""
+    Copyright (c) 2013, Triad National Security, LLC
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, are permitted provided that the
+    following conditions are met:
+
+    * Redistributions of source code must retain the above copyright notice, this list of conditions and the following
+      disclaimer.
+    * Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the
+      following disclaimer in the documentation and/or other materials provided with the distribution.
+    * Neither the name of Triad National Security, LLC nor the names of its contributors may be used to endorse or
+      promote products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES,
+    INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+    DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+    SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+    SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+    WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+    THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from datetime import datetime
+import itertools
+import json
+import os
+import random
+
+from .harmony_search import _create_search, _run_tasks
+
+# the HS settings that can be swept, i.e., the objective function methods get_<setting>()
+SETTINGS = ('max_imp', 'hms', 'hmcr', 'par', 'mpap', 'mpai')
+
+
+class TunedObjectiveFunction(object):
+
+    """
+        Wraps an objective function and overrides some of its HS settings, so that the same objective can be run with different
+        settings without editing it. settings is a dictionary mapping setting names (see SETTINGS) to values; every other method is passed
+        through to the wrapped objective function.
+
+        >>> tuned = TunedObjectiveFunction(obj_fun, {'hms': 50, 'par': 0.3})
+        >>> print tuned.get_hms()
+        50
+    """
+
+    def __init__(self, objective_function, settings):
+        unknown = set(settings) - set(SETTINGS)
+        if unknown:
+            raise ValueError('Unknown HS settings: {}.'.format(', '.join(sorted(unknown))))
+        self._objective_function = objective_function
+        self._settings = dict(settings)
+
+    def __getattr__(self, name):
+        # guard against infinite recursion while unpickling, before _objective_function has been set
+        if name.startswith('__') or name in ('_objective_function', '_settings'):
+            raise AttributeError(name)
+        return getattr(self._objective_function, name)
+
+    def _get(self, setting):
+        if setting in self._settings:
+            return self._settings[setting]
+        return getattr(self._objective_function, 'get_' + setting)()
+
+    def get_max_imp(self):
+        return self._get('max_imp')
+
+    def get_hms(self):
+        return self._get('hms')
+
+    def get_hmcr(self):
+        return self._get('hmcr')
+
+    def get_par(self):
+        return self._get('par')
+
+    def get_mpap(self):
+        return self._get('mpap')
+
+    def get_mpai(self):
+        return self._get('mpai')
+
+
+def grid(**values):
+    """
+        Return the list of all combinations of the given setting values.
+
+        >>> grid(hms=[10, 50], par=[0.3, 0.5])
+        [{'hms': 10, 'par': 0.3}, {'hms': 10, 'par': 0.5}, {'hms': 50, 'par': 0.3}, {'hms': 50, 'par': 0.5}]
+    """
+    names = sorted(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*[values[name] for name in names])]
+
+
+def random_settings(num_settings, random_seed=None, **ranges):
+    """
+        Return num_settings randomly sampled settings. Each range is either a (low, high) tuple, sampled uniformly (as integers if both
+        bounds are integers), or a list of values to choose from.
+
+        >>> random_settings(2, hms=(10, 100), hmcr=(0.5, 0.99), mpai=[1, 2, 4])
+        [{'hmcr': 0.83, 'hms': 71, 'mpai': 2}, {'hmcr': 0.61, 'hms': 18, 'mpai': 4}]
+    """
+    rng = random.Random(random_seed)
+    settings = list()
+    for _ in range(num_settings):
+        setting = dict()
+        for name in sorted(ranges):
+            values = ranges[name]
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    setting[name] = rng.randint(low, high)
+                else:
+                    setting[name] = rng.uniform(low, high)
+            else:
+                setting[name] = rng.choice(values)
+        settings.append(setting)
+    return settings
+
+
+def harmony_search_sweep(objective_function, settings, num_processes, num_iterations, results_path=None, max_run_retries=2, mp_context=None,
+                         **kwargs):
+    """
+        Run num_iterations harmony searches for each of the given settings (e.g., from grid() or random_settings()) and summarize how well
+        each setting did. All (setting, restart) pairs are scheduled on one shared pool of num_processes processes, so a sweep keeps every
+        core busy even when the number of restarts per setting is small.
+
+        If results_path is given, a JSON object describing each run (its settings, restart number, best harmony and fitness, number of
+        evaluations, and run time in seconds) is appended to that file as a line as soon as the run finishes. Runs already in the file are
+        skipped, so an interrupted sweep can be resumed by calling this again with the same arguments.
+
+        Return a list with one dictionary per setting, in the order given, holding the settings, the number of completed runs, the best and
+        mean best fitness over those runs, the total number of evaluations, and the total run time. mp_context selects the start method
+        of the worker processes (see ``harmony_search``). Any additional keyword arguments are passed on to HarmonySearch.
+    """
+    runs = list()
+    done = set()
+    if results_path is not None and os.path.exists(results_path):
+        with open(results_path) as f:
+            for line in f:
+                if line.strip():
+                    run = json.loads(line)
+                    runs.append(run)
+                    done.add((_settings_key(run['settings']), run['restart']))
+
+    tasks = list()
+    for setting in settings:
+        for restart in range(num_iterations):
+            if (_settings_key(setting), restart) not in done:
+                tasks.append((_sweep_worker, (objective_function, setting, restart, kwargs), dict()))
+
+    results_file = open(results_path, 'a') if results_path is not None else None
+
+    def record(i, run):
+        runs.append(run)
+        if results_file is not None:
+            results_file.write(json.dumps(run, default=str) + '\n')
+            results_file.flush()
+
+    try:
+        _run_tasks(num_processes, tasks, max_run_retries, callback=record, mp_context=mp_context)
+    finally:
+        if results_file is not None:
+            results_file.close()
+
+    return [_summarize_setting(objective_function, setting, [run for run in runs if _settings_key(run['settings']) == _settings_key(setting)])
+            for setting in settings]
+
+
+def _settings_key(settings):
+    return json.dumps(settings, sort_keys=True)
+
+
+def _sweep_worker(objective_function, settings, restart, kwargs):
+    """
+        Do one run of a sweep and describe it as a JSON-serializable dictionary.
+    """
+    start = datetime.now()
+    hs = _create_search(TunedObjectiveFunction(objective_function, settings), **kwargs)
+    best_harmony, best_fitness, _, _ = hs.run()
+    end = datetime.now()
+    return {'settings': settings, 'restart': restart, 'best_harmony': best_harmony, 'best_fitness': best_fitness,
+            'evaluations': hs._statistics()['evaluations'], 'time': (end - start).total_seconds()}
+
+
+def _summarize_setting(objective_function, settings, runs):
+    best_fitnesses = [run['best_fitness'] for run in runs]
+    if best_fitnesses:
+        best_fitness = max(best_fitnesses) if objective_function.maximize() else min(best_fitnesses)
+        mean_best_fitness = sum(best_fitnesses) / len(best_fitnesses)
+    else:
+        best_fitness = mean_best_fitness = None
+    return {'settings': settings, 'runs': len(runs), 'best_fitness': best_fitness, 'mean_best_fitness': mean_best_fitness,
+            'evaluations': sum(run['evaluations'] for run in runs), 'time': sum(run['time'] for run in runs)}
@@ -57,4 +57,9 @@ For more information on pyHarmonySearch, visit the `GitHub project page <https:/
     packages=[
         'pyharmonysearch',
     ],
+    entry_points={
+        'console_scripts': [
+            'pyharmonysearch = pyharmonysearch.cli:main',
+        ],
+    },
 )